@@ -46,31 +46,21 @@ async def run_demo():
         service_task = asyncio.create_task(service.start())
         await asyncio.sleep(0.5)  # Wait for service to start
 
-        # 4. Simulate a Client using the bus directly
-        received_response = asyncio.Event()
-        response_data = {}
-
-        async def on_response(data):
-            nonlocal response_data
-            response_data = data
-            received_response.set()
-
-        await service.bus.subscribe_to_commands("agent_responses", on_response)
-
+        # 4. Simulate a Client using the bus directly. request() stamps a
+        # correlation id and routes the matching response back to us, so the
+        # client does not need to subscribe to and filter agent_responses.
         print("Client: Sending command 'hello'...")
-        await service.bus.publish_response(
-            "agent_commands",
-            {"source_id": "demo_session_1", "user_id": "demo_user", "content": "hello"},
-        )
-
-        # 5. Listen for Response
-        print("Client: Waiting for response...")
         try:
-            await asyncio.wait_for(received_response.wait(), timeout=5.0)
+            response_data = await service.bus.request(
+                "agent_commands",
+                {"source_id": "demo_session_1", "user_id": "demo_user", "content": "hello"},
+                timeout=5.0,
+            )
+            # 5. Response received
             print("Client: Received response from agent!")
             print(f"Agent says: {response_data['content']}")
             print(f"Needs input: {response_data['needs_input']}")
-        except asyncio.TimeoutError:
+        except TimeoutError:
             print("Client: Timeout waiting for response.")
 
         # 6. Cleanup
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Allows ``burst`` events at once, refilled at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> float:
+        """Takes a token. Returns 0 on success, else seconds until one is available."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Admits agent turns under a global in-flight ceiling and per-user token
+    buckets, rejecting the rest immediately so overload shows up as fast
+    refusals instead of growing latency for everyone.
+
+    Buckets are kept for at most ``max_users`` users; the least recently seen
+    ones are dropped first, which only forgets their spent tokens.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        user_rate: Optional[float] = None,
+        user_burst: float = 5,
+        user_rates: Optional[Dict[str, float]] = None,
+        max_users: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._user_rate = user_rate
+        self._user_burst = user_burst
+        self._user_rates = dict(user_rates or {})
+        self._max_users = max_users
+        self._clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected: Dict[str, int] = {"overloaded": 0, "rate_limited": 0}
+
+    def _bucket(self, user_id: str) -> Optional[TokenBucket]:
+        rate = self._user_rates.get(user_id, self._user_rate)
+        if rate is None:
+            return None
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(
+                rate, self._user_burst, self._clock
+            )
+            while len(self._buckets) > self._max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def try_admit(self, user_id: str) -> Optional[Tuple[str, float]]:
+        """
+        Admits a turn for ``user_id``, to be followed by ``release()``.
+        Returns None if admitted, else (reason, retry_after_seconds).
+        """
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            self.rejected["overloaded"] += 1
+            return "overloaded", 1.0
+        bucket = self._bucket(user_id)
+        if bucket is not None:
+            wait = bucket.try_take()
+            if wait:
+                self.rejected["rate_limited"] += 1
+                return "rate_limited", wait
+        self.in_flight += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
@@ -1,7 +1,8 @@
 import os
 import functools
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional
 from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 from . import tools_internal
 from .config import AgentConfig
@@ -90,33 +91,66 @@ class AgentWrapper:
         )
 
     async def process_command(
-        self, runner: Any, source_id: str, user_id: str, content: str
+        self,
+        runner: Any,
+        source_id: str,
+        user_id: str,
+        content: str,
+        on_chunk: Optional[Callable[[str], Awaitable[None]]] = None,
     ) -> Dict[str, Any]:
-        """Processes a user command through the ADK runner and handles output aggregation."""
+        """
+        Processes a user command through the ADK runner and handles output aggregation.
+
+        With ``on_chunk``, the model output is requested as a stream and each
+        new piece of text is passed to it as soon as it arrives; the returned
+        response still carries the full text.
+        """
         new_message = types.Content(role="user", parts=[types.Part(text=content)])
+        run_config = None
+        if on_chunk is not None:
+            run_config = RunConfig(streaming_mode=StreamingMode.SSE)
 
         assistant_text_parts = []
         needs_input = False
         seen_questions = set()
+        # Set while partial events are streaming text that the closing
+        # aggregated event will repeat.
+        streamed = False
 
         async for event in runner.run_async(
-            user_id=user_id, session_id=source_id, new_message=new_message
+            user_id=user_id,
+            session_id=source_id,
+            new_message=new_message,
+            run_config=run_config,
         ):
-            if event.author == self.agent.name and event.content:
+            if event.author != self.agent.name or not event.content:
+                continue
+            # Partial events only arrive when streaming was requested.
+            if on_chunk is not None and event.partial:
                 for part in event.content.parts:
                     if part.text:
-                        assistant_text_parts.append(part.text)
-
-                    if (
-                        part.function_call
-                        and part.function_call.name == "request_user_input"
-                    ):
-                        needs_input = True
-                        if "question" in part.function_call.args:
-                            q = part.function_call.args["question"]
-                            if q not in seen_questions:
-                                assistant_text_parts.append(f"\n{q}")
-                                seen_questions.add(q)
+                        streamed = True
+                        await on_chunk(part.text)
+                continue
+            for part in event.content.parts:
+                if part.text:
+                    assistant_text_parts.append(part.text)
+                    if on_chunk is not None and not streamed:
+                        await on_chunk(part.text)
+
+                if (
+                    part.function_call
+                    and part.function_call.name == "request_user_input"
+                ):
+                    needs_input = True
+                    if "question" in part.function_call.args:
+                        q = part.function_call.args["question"]
+                        if q not in seen_questions:
+                            assistant_text_parts.append(f"\n{q}")
+                            seen_questions.add(q)
+                            if on_chunk is not None:
+                                await on_chunk(f"\n{q}")
+            streamed = False
 
         assistant_text = "".join(assistant_text_parts).strip()
 
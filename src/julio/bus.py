@@ -1,83 +1,1113 @@
 import asyncio
 import logging
-from typing import Callable, Dict, List, Awaitable, Set
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import IntEnum
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Awaitable,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .bus_log import CommandLog
+from .bus_metrics import BusMetrics
+from .bus_scheduler import CronSchedule, TimerScheduler
 
 logger = logging.getLogger(__name__)
 
 
+def _routing_key(value: Any) -> Any:
+    """
+    A message field value usable as a lane or flow key. Unhashable values
+    (lists, dicts) come from untrusted clients and are keyed by their text.
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return str(value)
+    return value
+
+
+class Priority(IntEnum):
+    """Dispatch priority of a published message. Lower values are served first."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+class CircuitBreaker:
+    """
+    Sheds load for a subscriber that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects deliveries for ``reset_timeout`` seconds. It then lets a single
+    trial delivery through (half-open): success closes it, failure reopens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Returns True if a delivery may be attempted now."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Message bus circuit breaker closed.")
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or (
+            self.state == "closed" and self._failures >= self.failure_threshold
+        ):
+            self.state = "open"
+            self._opened_at = self._clock()
+            logger.warning(
+                f"Message bus circuit breaker opened after {self._failures} failures."
+            )
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """
+    Exponential backoff for failed deliveries.
+
+    A delivery is attempted at most ``max_attempts`` times. The n-th retry
+    waits ``base_delay * 2 ** (n - 1)`` seconds, capped at ``max_delay`` and
+    reduced by up to ``jitter`` (a fraction) at random so retries of a burst
+    of failures do not all fire at once.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    jitter: float = 0.5
+
+    def delay(self, attempt: int) -> float:
+        """Returns the wait before retrying after the given failed attempt."""
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return backoff * (1 - self.jitter * random.random())
+
+
+@dataclass(slots=True)
+class _Subscription:
+    """A subscriber callback with its isolation settings."""
+
+    callback: Callable[[dict], Awaitable[None]]
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    breaker: Optional[CircuitBreaker] = None
+    retry: Optional[RetryPolicy] = None
+    # Merges the messages waiting in a busy lane into a single message.
+    coalesce: Optional[Callable[[List[dict]], dict]] = None
+    # Only consecutive messages with the same value of this field are merged.
+    coalesce_key: Optional[str] = None
+    in_flight: int = 0
+    # Deliveries held back while the bulkhead is full.
+    backlog: Deque["_Delivery"] = field(default_factory=deque)
+
+    def is_saturated(self) -> bool:
+        return self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+
+
+@dataclass(slots=True)
+class _LogEntry:
+    """A command log entry, acked once every delivery of it has been handled."""
+
+    id: int
+    remaining: int = 0
+
+
+@dataclass(slots=True)
+class _Delivery:
+    """A message queued for a single subscriber callback."""
+
+    channel: str
+    subscription: _Subscription
+    message: dict
+    lane: Optional[Tuple]
+    priority: Priority
+    flow: Any = None
+    # Loop time of publication, and of the last put on the ready queue.
+    published_at: float = 0.0
+    enqueued_at: float = 0.0
+    entry: Optional[_LogEntry] = None
+    attempts: int = 0
+    retry_handle: Optional[asyncio.TimerHandle] = None
+    # Deliveries folded into this one by the subscription's coalesce hook.
+    coalesced: List["_Delivery"] = field(default_factory=list)
+
+
+class _FairLevel:
+    """
+    Deficit round robin across flows (e.g. tenants) within one priority level.
+
+    Each flow earns its weight in credit every time it reaches the head of the
+    round and spends one credit per delivery, so a flow with weight 2 gets
+    twice the dispatches of a flow with weight 1 while both are backlogged.
+    """
+
+    def __init__(self, weights: Dict[Any, float]):
+        self._weights = weights
+        self._flows: Dict[Any, Deque[_Delivery]] = {}
+        self._deficits: Dict[Any, float] = {}
+        self._active: Deque[Any] = deque()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, item: _Delivery):
+        items = self._flows.get(item.flow)
+        if items is None:
+            items = self._flows[item.flow] = deque()
+            self._deficits[item.flow] = 0.0
+            self._active.append(item.flow)
+        items.append(item)
+        self._size += 1
+
+    def popleft(self) -> _Delivery:
+        while True:
+            flow = self._active[0]
+            deficit = self._deficits[flow]
+            if deficit < 1:
+                deficit += self._weights.get(flow, 1.0)
+                if deficit < 1:
+                    # Low-weight flows accumulate credit over several rounds.
+                    self._deficits[flow] = deficit
+                    self._active.rotate(-1)
+                    continue
+
+            items = self._flows[flow]
+            item = items.popleft()
+            self._size -= 1
+            deficit -= 1
+            if not items:
+                # Idle flows are forgotten, along with any unused credit.
+                del self._flows[flow]
+                del self._deficits[flow]
+                self._active.popleft()
+            else:
+                self._deficits[flow] = deficit
+                if deficit < 1:
+                    self._active.rotate(-1)
+            return item
+
+
+class _MultiLevelQueue:
+    """
+    Queue with one fair-share level per priority, served highest priority first.
+
+    A non-empty lower level that has been passed over ``starvation_limit``
+    times in a row is served next, so background traffic keeps moving even
+    while interactive traffic is saturating the workers.
+    """
+
+    def __init__(
+        self, starvation_limit: int = 8, weights: Optional[Dict[Any, float]] = None
+    ):
+        self._levels: List[_FairLevel] = [_FairLevel(weights or {}) for _ in Priority]
+        self._skips: List[int] = [0 for _ in Priority]
+        self._starvation_limit = starvation_limit
+        self._size = 0
+        self._available = asyncio.Semaphore(0)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def put_nowait(self, item: _Delivery):
+        self._levels[item.priority].append(item)
+        self._size += 1
+        self._available.release()
+
+    async def get(self) -> _Delivery:
+        await self._available.acquire()
+        return self._pop()
+
+    def _pop(self) -> _Delivery:
+        waiting = [level for level, items in enumerate(self._levels) if items]
+        chosen = waiting[0]
+        for level in waiting[1:]:
+            if self._skips[level] >= self._starvation_limit:
+                chosen = level
+                break
+        for level in waiting:
+            if level == chosen:
+                self._skips[level] = 0
+            elif level > chosen:
+                self._skips[level] += 1
+        self._size -= 1
+        return self._levels[chosen].popleft()
+
+
 class MessageBus:
     """
-    An in-memory message bus using asyncio.Queue.
+    An in-memory message bus backed by a multi-level priority queue.
     Replaces Redis for single-process environments.
+
+    When ``partition_key`` is set, messages carrying the same value for that
+    field are delivered to each subscriber strictly in publish order (one
+    logical lane per key), while different keys are still processed in
+    parallel by the worker pool.
+
+    When ``fair_key`` is set, messages of the same priority are shared out
+    across the values of that field (e.g. ``user_id``) by weighted deficit
+    round robin, so one busy tenant cannot queue everyone else behind it.
+
+    Producers can apply backpressure by publishing with ``wait=True``, which
+    waits for queue capacity instead of dropping, and can query ``credits()``
+    and ``congested`` (high/low watermark hysteresis) to slow down early.
+
+    The worker pool is elastic: it grows between ``min_tasks`` and
+    ``max_tasks`` when ready messages outnumber idle workers or wait longer
+    than ``scale_up_wait``, and workers idle for ``idle_timeout`` seconds are
+    reaped. ``pool_stats()`` reports the pool size and recent decisions.
+
+    ``request()`` publishes a message stamped with a ``correlation_id`` and
+    waits for the reply carrying the same id on the reply channel, which is
+    routed straight to the caller instead of being filtered by subscribers.
+
+    With a ``command_log``, messages on ``durable_channels`` are appended to
+    the log before being queued and acked once handled; ``replay_pending()``
+    re-delivers whatever a previous run left unacked.
+
+    Per-channel metrics are kept in ``metrics`` and exported through
+    ``metrics_snapshot()`` and ``render_metrics()``.
+
+    Failed deliveries are retried with backoff according to the
+    subscription's (or the bus-wide) ``RetryPolicy``, keeping their lane so
+    ordering holds. Deliveries that exhaust their attempts go to the
+    ``dead_letters`` store, from which ``replay_dead_letters()`` republishes.
+
+    Messages may carry a ``deadline`` (Unix timestamp), stamped from a
+    per-publish ``ttl`` or the channel's default in ``message_ttls``. Workers
+    skip expired messages before dispatch and count them as ``expired``;
+    with ``dead_letter_expired`` they are dead-lettered instead of dropped.
+
+    ``publish_at()``, ``publish_after()`` and ``schedule_recurring()`` hand
+    messages to a timer scheduler that publishes them when due; with a
+    ``schedule_store`` such as Persistence the timers survive restarts.
     """
 
-    def __init__(self, max_tasks: int = 50, max_queue_size: int = 0, *args, **kwargs):
+    def __init__(
+        self,
+        max_tasks: int = 50,
+        max_queue_size: int = 0,
+        *args,
+        partition_key: Optional[str] = None,
+        starvation_limit: int = 8,
+        fair_key: Optional[str] = None,
+        fair_weights: Optional[Dict[str, float]] = None,
+        high_watermark: float = 0.8,
+        low_watermark: float = 0.5,
+        min_tasks: int = 1,
+        idle_timeout: float = 60.0,
+        scale_up_wait: float = 0.1,
+        command_log: Optional[CommandLog] = None,
+        durable_channels: Iterable[str] = (),
+        retry_policy: Optional[RetryPolicy] = None,
+        dead_letters: Optional[Any] = None,
+        schedule_store: Optional[Any] = None,
+        message_ttls: Optional[Dict[str, float]] = None,
+        dead_letter_expired: bool = False,
+        **kwargs,
+    ):
         # We accept args/kwargs for compatibility with previous Redis-based init
-        self._subscribers: Dict[str, Set[Callable[[dict], Awaitable[None]]]] = {}
-        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        for flow, weight in (fair_weights or {}).items():
+            if weight <= 0:
+                raise ValueError(f"Fair-share weight for {flow!r} must be positive")
+        if not 0 <= low_watermark <= high_watermark <= 1:
+            raise ValueError("Watermarks must satisfy 0 <= low <= high <= 1")
+        if not 1 <= min_tasks <= max_tasks:
+            raise ValueError("Worker pool bounds must satisfy 1 <= min <= max")
+        self._subscribers: Dict[str, Dict[Callable, _Subscription]] = {}
+        # Capacity is enforced in publish_response so that messages parked in a
+        # lane backlog count towards max_queue_size as well.
+        self._queue = _MultiLevelQueue(starvation_limit, fair_weights)
+        self._max_queue_size = max_queue_size
+        self._partition_key = partition_key
+        self._fair_key = fair_key
+        # Active lanes, keyed by (callback, partition value). A lane exists while
+        # one of its messages is queued or running; later messages wait in its
+        # backlog until the previous one has been handled.
+        self._lanes: Dict[Tuple[Callable, Any], Deque[_Delivery]] = {}
+        self._parked = 0
+        # Publishers waiting for capacity, woken in FIFO order as workers dequeue.
+        self._putters: Deque[asyncio.Future] = deque()
+        self._high_watermark = int(max_queue_size * high_watermark)
+        self._low_watermark = int(max_queue_size * low_watermark)
+        self._congested = False
+        self._min_tasks = min_tasks
         self._max_tasks = max_tasks
+        self._idle_timeout = idle_timeout
+        self._scale_up_wait = scale_up_wait
         self._workers: Set[asyncio.Task] = set()
+        # Workers waiting on the queue, including ones spawned but not yet running.
+        self._idle_workers = 0
+        self._spawned_total = 0
+        self._reaped_total = 0
+        self._scaling_decisions: Deque[dict] = deque(maxlen=100)
+        # Callers of request() waiting for a reply, keyed by (channel, correlation id).
+        self._pending_replies: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Their on_partial hooks, called for each streamed chunk of the reply.
+        self._partial_handlers: Dict[Tuple[str, str], Callable[[dict], Any]] = {}
+        self._command_log = command_log
+        self._durable_channels = frozenset(durable_channels)
+        self.metrics = BusMetrics()
+        self._retry_policy = retry_policy
+        self._retry_handles: Set[asyncio.TimerHandle] = set()
+        # Store with async add/list/remove, see julio.dead_letters.
+        self._dead_letters = dead_letters
+        self._message_ttls = dict(message_ttls or {})
+        self._dead_letter_expired = dead_letter_expired
+        self._scheduler = TimerScheduler(self.publish_response, schedule_store)
         self._stop_event = asyncio.Event()
 
     async def start(self):
-        """Starts the worker pool with an initial worker."""
-        self._maybe_spawn_worker()
+        """Starts the worker pool with its minimum number of workers."""
+        if self._command_log is not None:
+            await self._command_log.open()
+        for _ in range(self._min_tasks):
+            self._maybe_spawn_worker()
+        await self._scheduler.start()
         logger.info("Started message bus.")
 
-    def _maybe_spawn_worker(self):
+    def _maybe_spawn_worker(self, reason: Optional[str] = None):
         """Spawns a new worker task if we haven't reached the limit."""
         if len(self._workers) < self._max_tasks:
             worker = asyncio.create_task(self._worker())
             self._workers.add(worker)
             worker.add_done_callback(self._workers.discard)
+            self._idle_workers += 1
+            self._spawned_total += 1
+            if reason:
+                self._record_scaling("scale_up", reason)
             return True
         return False
 
+    def _record_scaling(self, action: str, reason: str):
+        decision = {
+            "time": time.time(),
+            "action": action,
+            "reason": reason,
+            "workers": len(self._workers),
+        }
+        self._scaling_decisions.append(decision)
+        logger.debug(f"Message bus {action} ({reason}): {len(self._workers)} workers")
+
+    def pool_stats(self) -> dict:
+        """Returns the current worker pool size and its recent scaling decisions."""
+        return {
+            "workers": len(self._workers),
+            "idle": self._idle_workers,
+            "min": self._min_tasks,
+            "max": self._max_tasks,
+            "spawned_total": self._spawned_total,
+            "reaped_total": self._reaped_total,
+            "decisions": list(self._scaling_decisions),
+        }
+
+    def _lane_for(self, callback: Callable, message: dict) -> Optional[Tuple]:
+        """Returns the lane a message belongs to, or None if it is unordered."""
+        if self._partition_key is None:
+            return None
+        value = message.get(self._partition_key)
+        if value is None:
+            return None
+        return (callback, _routing_key(value))
+
+    def _release_lane(self, lane: Tuple):
+        """Hands the lane to its next parked message, or closes it if idle."""
+        backlog = self._lanes.get(lane)
+        if backlog:
+            self._parked -= 1
+            delivery = backlog.popleft()
+            if backlog and delivery.subscription.coalesce is not None:
+                delivery = self._coalesce(delivery, backlog)
+            # Re-enqueue rather than running it inline so a busy lane takes turns
+            # with other keys instead of pinning this worker.
+            self._enqueue(delivery)
+        else:
+            self._lanes.pop(lane, None)
+
+    def _coalesce(self, first: _Delivery, backlog: Deque[_Delivery]) -> _Delivery:
+        """
+        Folds the deliveries waiting in a lane into ``first``, up to the first
+        one whose ``coalesce_key`` value differs.
+        """
+        key = first.subscription.coalesce_key
+        batch = [first]
+        while backlog and (
+            key is None or backlog[0].message.get(key) == first.message.get(key)
+        ):
+            batch.append(backlog.popleft())
+        if len(batch) == 1:
+            return first
+        self._parked -= len(batch) - 1
+        try:
+            message = first.subscription.coalesce([d.message for d in batch])
+        except Exception as e:
+            logger.error(f"Error coalescing messages on channel {first.channel}: {e!r}")
+            # Fall back to handling them one by one.
+            backlog.extendleft(reversed(batch[1:]))
+            self._parked += len(batch) - 1
+            return first
+        first.message = message
+        first.priority = min(d.priority for d in batch)
+        first.coalesced.extend(batch[1:])
+        metrics = self.metrics.channel(first.channel)
+        metrics.depth -= len(batch) - 1
+        metrics.coalesced += len(batch) - 1
+        return first
+
+    def _enqueue(self, delivery: _Delivery):
+        delivery.enqueued_at = asyncio.get_running_loop().time()
+        self._queue.put_nowait(delivery)
+        if self._queue.qsize() > self._idle_workers:
+            self._maybe_spawn_worker("queue_depth")
+
+    async def _next_delivery(self) -> Optional[_Delivery]:
+        """Waits for a delivery, or returns None if this worker should retire."""
+        while True:
+            if len(self._workers) <= self._min_tasks:
+                return await self._queue.get()
+            try:
+                async with asyncio.timeout(self._idle_timeout):
+                    return await self._queue.get()
+            except TimeoutError:
+                if len(self._workers) > self._min_tasks:
+                    # Leave the pool now so concurrent reapers see the new size.
+                    self._workers.discard(asyncio.current_task())
+                    self._reaped_total += 1
+                    self._record_scaling("scale_down", "idle")
+                    return None
+
     async def _worker(self):
         """Worker task that processes messages from the queue."""
-        while not self._stop_event.is_set():
-            try:
-                # Get the next callback/message pair from the queue
-                callback, message = await self._queue.get()
+        idle = True
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    # Get the next delivery from the queue
+                    delivery = await self._next_delivery()
+                    if delivery is None:
+                        break
+                    if delivery.subscription.is_saturated():
+                        # Bulkhead full: hold it aside instead of pinning this worker.
+                        delivery.subscription.backlog.append(delivery)
+                        self._parked += 1
+                        continue
+                    idle = False
+                    self._idle_workers -= 1
+                    self._on_capacity_freed()
+                    try:
+                        await self._handle(delivery)
+                    finally:
+                        idle = True
+                        self._idle_workers += 1
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    logger.error(f"Unexpected error in message bus worker: {e!r}")
+        finally:
+            if idle:
+                self._idle_workers -= 1
+
+    async def _handle(self, delivery: _Delivery):
+        """Runs one delivery through its subscriber's breaker, timeout and bulkhead."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if (
+            now - delivery.enqueued_at > self._scale_up_wait
+            and self._idle_workers == 0
+            and not self._queue.empty()
+        ):
+            self._maybe_spawn_worker("wait_time")
+        metrics = self.metrics.channel(delivery.channel)
+        metrics.depth -= 1
+        metrics.queue_wait.observe(now - delivery.published_at)
+
+        subscription = delivery.subscription
+        breaker = subscription.breaker
+        subscription.in_flight += 1
+        retrying = False
+        try:
+            deadline = delivery.message.get("deadline")
+            if deadline is not None and deadline <= time.time():
+                # Nobody is waiting for the result any more.
+                metrics.expired += 1
+                if self._dead_letter_expired:
+                    await self._dead_letter(delivery, "expired")
+            elif breaker is not None and not breaker.allow():
+                metrics.shed += 1
+            else:
+                error = None
                 try:
-                    await callback(message)
+                    if subscription.timeout is None:
+                        await subscription.callback(delivery.message)
+                    else:
+                        async with asyncio.timeout(subscription.timeout):
+                            await subscription.callback(delivery.message)
+                except TimeoutError as e:
+                    error = e
+                    metrics.timeouts += 1
+                    logger.error(
+                        f"Message bus subscriber timed out after {subscription.timeout}s "
+                        f"on channel: {delivery.channel}"
+                    )
                 except Exception as e:
+                    error = e
                     logger.error(f"Error in message bus subscriber: {e!r}")
-                finally:
-                    self._queue.task_done()
-            except asyncio.CancelledError:
+                metrics.handler_duration.observe(loop.time() - now)
+
+                if error is None:
+                    metrics.handled += 1
+                    if breaker is not None:
+                        breaker.record_success()
+                else:
+                    metrics.errors += 1
+                    if breaker is not None:
+                        breaker.record_failure()
+                    retrying = await self._on_failure(delivery, error)
+            # Not reached on cancellation, so in-flight commands
+            # stay in the log and are replayed after a restart.
+            if not retrying:
+                self._settle(delivery)
+        finally:
+            subscription.in_flight -= 1
+            if subscription.backlog:
+                self._parked -= 1
+                self._enqueue(subscription.backlog.popleft())
+            # A delivery waiting for its retry keeps its lane to preserve order.
+            if delivery.lane is not None and not retrying:
+                self._release_lane(delivery.lane)
+
+    async def _on_failure(self, delivery: _Delivery, error: Exception) -> bool:
+        """Schedules a retry, or dead-letters the delivery. Returns True on retry."""
+        delivery.attempts += 1
+        metrics = self.metrics.channel(delivery.channel)
+        policy = delivery.subscription.retry or self._retry_policy
+        if policy is not None and delivery.attempts < policy.max_attempts:
+            delay = policy.delay(delivery.attempts)
+            metrics.retries += 1
+            metrics.depth += 1
+            self._parked += 1
+            delivery.retry_handle = asyncio.get_running_loop().call_later(
+                delay, self._retry_due, delivery
+            )
+            self._retry_handles.add(delivery.retry_handle)
+            logger.info(
+                f"Retrying message on channel {delivery.channel} in {delay:.2f}s "
+                f"(attempt {delivery.attempts + 1}/{policy.max_attempts})"
+            )
+            return True
+
+        await self._dead_letter(delivery, repr(error))
+        return False
+
+    async def _dead_letter(self, delivery: _Delivery, error: str):
+        if self._dead_letters is None:
+            return
+        letter = {
+            "channel": delivery.channel,
+            "message": delivery.message,
+            "priority": int(delivery.priority),
+            "error": error,
+            "attempts": delivery.attempts,
+            "failed_at": time.time(),
+        }
+        try:
+            await self._dead_letters.add(letter)
+            self.metrics.channel(delivery.channel).dead_lettered += 1
+            logger.warning(
+                f"Dead-lettered message on channel {delivery.channel} "
+                f"after {delivery.attempts} attempts ({error})"
+            )
+        except Exception as e:
+            logger.error(f"Failed to store dead letter: {e!r}")
+
+    def _retry_due(self, delivery: _Delivery):
+        self._retry_handles.discard(delivery.retry_handle)
+        delivery.retry_handle = None
+        if self._stop_event.is_set():
+            return
+        self._parked -= 1
+        self._enqueue(delivery)
+
+    async def dead_letters(
+        self, channel: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[dict]:
+        """Returns dead letters oldest first, optionally for one channel only."""
+        if self._dead_letters is None:
+            return []
+        return await self._dead_letters.list(channel, limit)
+
+    async def replay_dead_letters(
+        self, channel: Optional[str] = None, limit: Optional[int] = None
+    ) -> int:
+        """
+        Republishes dead letters with a fresh retry budget and TTL, and removes
+        the ones that were queued again. Returns the number replayed.
+        """
+        replayed = []
+        for letter in await self.dead_letters(channel, limit):
+            # A stale deadline would expire the message again straight away.
+            message = {k: v for k, v in letter["message"].items() if k != "deadline"}
+            if await self.publish_response(
+                letter["channel"], message, letter["priority"], wait=True
+            ):
+                replayed.append(letter["id"])
+        if replayed:
+            await self._dead_letters.remove(replayed)
+            logger.info(f"Replayed {len(replayed)} dead letters.")
+        return len(replayed)
+
+    def _settle(self, delivery: _Delivery):
+        """Acks the delivery's log entry once all of its deliveries are done."""
+        for settled in (delivery, *delivery.coalesced):
+            entry = settled.entry
+            if entry is not None:
+                entry.remaining -= 1
+                if entry.remaining == 0:
+                    self._command_log.ack(entry.id)
+
+    @property
+    def depth(self) -> int:
+        """Number of deliveries waiting to be handled, including lane backlogs."""
+        return self._queue.qsize() + self._parked
+
+    def in_flight(self, channel: str) -> int:
+        """Number of deliveries currently being handled on ``channel``."""
+        return sum(s.in_flight for s in self._subscribers.get(channel, {}).values())
+
+    def credits(self) -> Optional[int]:
+        """Returns how many more deliveries fit in the queue, or None if unbounded."""
+        if self._max_queue_size <= 0:
+            return None
+        return max(self._max_queue_size - self.depth, 0)
+
+    @property
+    def congested(self) -> bool:
+        """
+        True once the depth reaches the high watermark, and until it drains
+        back down to the low watermark.
+        """
+        return self._congested
+
+    def _is_full(self) -> bool:
+        return self._max_queue_size > 0 and self.depth >= self._max_queue_size
+
+    def _update_congestion(self):
+        if self._max_queue_size <= 0:
+            return
+        depth = self.depth
+        if not self._congested and depth >= self._high_watermark:
+            self._congested = True
+            logger.info(f"Message bus congested (depth {depth}).")
+        elif self._congested and depth <= self._low_watermark:
+            self._congested = False
+            logger.info(f"Message bus drained (depth {depth}).")
+
+    def _on_capacity_freed(self):
+        self._update_congestion()
+        while self._putters:
+            putter = self._putters.popleft()
+            if not putter.done():
+                putter.set_result(None)
                 break
+
+    async def _wait_for_capacity(self, deadline: Optional[float]) -> bool:
+        """Waits until the queue has room, or returns False at the deadline."""
+        loop = asyncio.get_running_loop()
+        while self._is_full():
+            timeout = None if deadline is None else deadline - loop.time()
+            if timeout is not None and timeout <= 0:
+                return False
+            putter = loop.create_future()
+            self._putters.append(putter)
+            try:
+                await asyncio.wait_for(putter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Pass on a wake-up we received but can no longer use.
+                if putter.done() and not putter.cancelled() and not self._is_full():
+                    self._on_capacity_freed()
+                raise
+            finally:
+                if putter in self._putters:
+                    self._putters.remove(putter)
+        return True
+
+    async def publish_response(
+        self,
+        channel: str,
+        message: dict,
+        priority: Priority = Priority.NORMAL,
+        *,
+        wait: bool = False,
+        timeout: Optional[float] = None,
+        ttl: Optional[float] = None,
+    ) -> bool:
+        """
+        Publishes a message to a specific channel with the given priority.
+
+        If the queue is full the message is dropped, unless ``wait`` is set, in
+        which case the call waits up to ``timeout`` seconds for capacity.
+        Unless the message already has a ``deadline``, one is stamped ``ttl``
+        seconds (or the channel's default TTL) from now.
+        Returns False if the message was dropped for any subscriber.
+        """
+        self.metrics.channel(channel).published += 1
+        correlation_ids = list(message.get("correlation_ids", ()))
+        if message.get("correlation_id") is not None:
+            correlation_ids.append(message["correlation_id"])
+        # A reply to coalesced requests answers each of them; partial replies
+        # are streamed to the caller without completing the request.
+        for correlation_id in correlation_ids:
+            if message.get("partial"):
+                self._forward_partial(channel, correlation_id, message)
+            else:
+                self._resolve_reply(channel, correlation_id, message)
+
+        if channel not in self._subscribers:
+            return True
+
+        if ttl is None:
+            ttl = self._message_ttls.get(channel)
+        if ttl is not None and "deadline" not in message:
+            message = {**message, "deadline": time.time() + ttl}
+
+        deadline = None
+        if wait and timeout is not None:
+            deadline = asyncio.get_running_loop().time() + timeout
+
+        entry = None
+        if self._command_log is not None and channel in self._durable_channels:
+            entry = _LogEntry(
+                await self._command_log.append(channel, message, priority)
+            )
+        return await self._dispatch(
+            channel, message, Priority(priority), wait, deadline, entry
+        )
+
+    async def _dispatch(
+        self,
+        channel: str,
+        message: dict,
+        priority: Priority,
+        wait: bool,
+        deadline: Optional[float],
+        entry: Optional[_LogEntry],
+    ) -> bool:
+        """Queues one delivery of the message per subscriber of the channel."""
+        delivered = True
+        flow = _routing_key(message.get(self._fair_key)) if self._fair_key else None
+        metrics = self.metrics.channel(channel)
+        published_at = asyncio.get_running_loop().time()
+        if entry is not None:
+            # Hold the entry until every delivery is queued, so one handled
+            # while we wait for capacity cannot ack it early.
+            entry.remaining += 1
+        # Copy the subscribers, the set may change while we wait for capacity.
+        for subscription in tuple(self._subscribers.get(channel, {}).values()):
+            if self._is_full() and not (
+                wait and await self._wait_for_capacity(deadline)
+            ):
+                logger.warning(
+                    f"Message bus queue full ({self._max_queue_size}), dropping message for channel: {channel}"
+                )
+                metrics.dropped += 1
+                delivered = False
+                continue
+
+            lane = self._lane_for(subscription.callback, message)
+            delivery = _Delivery(
+                channel,
+                subscription,
+                message,
+                lane,
+                priority,
+                flow,
+                published_at=published_at,
+                entry=entry,
+            )
+            metrics.enqueued.mark()
+            metrics.depth += 1
+            if entry is not None:
+                entry.remaining += 1
+            if lane is not None and lane in self._lanes:
+                # An earlier message for this key is still pending.
+                self._lanes[lane].append(delivery)
+                self._parked += 1
+            else:
+                if lane is not None:
+                    self._lanes[lane] = deque()
+                self._enqueue(delivery)
+            self._update_congestion()
+
+        if entry is not None:
+            entry.remaining -= 1
+            if entry.remaining == 0:
+                # Handled already, or nobody will handle it: do not replay it.
+                self._command_log.ack(entry.id)
+        return delivered
+
+    async def replay_pending(self) -> int:
+        """
+        Re-queues messages the command log recovered from a previous run.
+        Call it once subscribers are registered. Returns the number replayed.
+        """
+        if self._command_log is None:
+            return 0
+        recovered = self._command_log.take_recovered()
+        for entry_id, channel, priority, message in recovered:
+            await self._dispatch(
+                channel, message, Priority(priority), True, None, _LogEntry(entry_id)
+            )
+        if recovered:
+            logger.info(f"Replayed {len(recovered)} messages from the command log.")
+        return len(recovered)
+
+    def _forward_partial(self, channel: str, correlation_id: str, message: dict):
+        handler = self._partial_handlers.get((channel, correlation_id))
+        if handler is not None:
+            try:
+                handler(message)
             except Exception as e:
-                logger.error(f"Unexpected error in message bus worker: {e!r}")
+                logger.error(f"Error in partial reply handler: {e!r}")
 
-    async def publish_response(self, channel: str, message: dict):
-        """Publishes a message to a specific channel."""
-        if channel in self._subscribers:
-            # If the queue is not empty, it might be a sign we need more workers
-            if not self._queue.empty():
-                self._maybe_spawn_worker()
+    def _resolve_reply(self, channel: str, correlation_id: str, message: dict):
+        future = self._pending_replies.pop((channel, correlation_id), None)
+        if future is not None and not future.done():
+            future.set_result(message)
 
-            for callback in self._subscribers[channel]:
-                try:
-                    self._queue.put_nowait((callback, message))
-                except asyncio.QueueFull:
-                    logger.warning(
-                        f"Message bus queue full ({self._queue.maxsize}), dropping message for channel: {channel}"
-                    )
+    async def request(
+        self,
+        channel: str,
+        message: dict,
+        *,
+        reply_channel: str = "agent_responses",
+        timeout: float = 30.0,
+        priority: Priority = Priority.NORMAL,
+        on_partial: Optional[Callable[[dict], Any]] = None,
+    ) -> dict:
+        """
+        Publishes a message and waits for its reply on ``reply_channel``.
+
+        The message is stamped with a fresh ``correlation_id``, which handlers
+        must copy into their reply, and expires with ``timeout`` so it is not
+        handled after the caller gave up. Replies marked ``partial`` are passed
+        to ``on_partial`` and the first other reply is returned. Raises
+        asyncio.QueueFull if the bus has no room within ``timeout`` and
+        TimeoutError if no reply arrives in time.
+        """
+        if channel == reply_channel:
+            raise ValueError("Request and reply channels must differ")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        correlation_id = uuid.uuid4().hex
+        key = (reply_channel, correlation_id)
+        future = loop.create_future()
+        self._pending_replies[key] = future
+        if on_partial is not None:
+            self._partial_handlers[key] = on_partial
+        try:
+            delivered = await self.publish_response(
+                channel,
+                {**message, "correlation_id": correlation_id},
+                priority,
+                wait=True,
+                timeout=timeout,
+                ttl=timeout,
+            )
+            if not delivered:
+                raise asyncio.QueueFull(f"Message bus queue full for channel: {channel}")
+            async with asyncio.timeout_at(deadline):
+                return await future
+        finally:
+            self._pending_replies.pop(key, None)
+            self._partial_handlers.pop(key, None)
+
+    def metrics_snapshot(self) -> dict:
+        """Returns bus-wide gauges and per-channel metrics as a dict."""
+        return self.metrics.snapshot(self._gauges())
+
+    def render_metrics(self) -> str:
+        """Returns the bus metrics in the Prometheus text format."""
+        return self.metrics.render_prometheus(self._gauges())
+
+    def _gauges(self) -> Dict[str, float]:
+        return {
+            "workers": len(self._workers),
+            "idle_workers": self._idle_workers,
+            "depth": self.depth,
+            "max_queue_size": self._max_queue_size,
+            "scheduled": len(self._scheduler),
+        }
+
+    async def publish_at(
+        self,
+        channel: str,
+        message: dict,
+        when: Union[float, datetime],
+        priority: Priority = Priority.NORMAL,
+    ) -> str:
+        """
+        Publishes ``message`` at ``when``, a Unix timestamp or aware datetime.
+        Returns a timer id for ``cancel_scheduled()``.
+        """
+        if isinstance(when, datetime):
+            when = when.timestamp()
+        return await self._scheduler.schedule(channel, message, when, priority)
+
+    async def publish_after(
+        self,
+        channel: str,
+        message: dict,
+        delay: float,
+        priority: Priority = Priority.NORMAL,
+    ) -> str:
+        """Publishes ``message`` after ``delay`` seconds. Returns a timer id."""
+        return await self._scheduler.schedule(
+            channel, message, time.time() + delay, priority
+        )
+
+    async def schedule_recurring(
+        self,
+        channel: str,
+        message: dict,
+        *,
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        start_at: Optional[float] = None,
+        priority: Priority = Priority.NORMAL,
+    ) -> str:
+        """
+        Publishes ``message`` every ``interval`` seconds, or on each minute
+        matching the five-field UTC ``cron`` expression, until cancelled.
+        Interval schedules first fire at ``start_at`` (default: one interval
+        from now). Returns a timer id.
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError("Pass exactly one of interval or cron")
+        now = time.time()
+        if cron is not None:
+            due_at = CronSchedule(cron).next_after(start_at or now)
+        else:
+            due_at = start_at if start_at is not None else now + interval
+        return await self._scheduler.schedule(
+            channel, message, due_at, priority, interval=interval, cron=cron
+        )
+
+    async def cancel_scheduled(self, timer_id: str) -> bool:
+        """Cancels a scheduled message. Returns False if it already fired."""
+        return await self._scheduler.cancel(timer_id)
 
     async def subscribe_to_commands(
-        self, channel: str, callback: Callable[[dict], Awaitable[None]]
+        self,
+        channel: str,
+        callback: Callable[[dict], Awaitable[None]],
+        *,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: float = 30.0,
+        retry: Optional[RetryPolicy] = None,
+        coalesce: Optional[Callable[[List[dict]], dict]] = None,
+        coalesce_key: Optional[str] = None,
     ):
-        """Subscribes to a channel and registers a callback."""
+        """
+        Subscribes to a channel and registers a callback.
+
+        ``timeout`` cancels a delivery that runs longer than that many seconds,
+        ``max_concurrency`` caps how many workers the callback may occupy at
+        once, and ``failure_threshold`` enables a circuit breaker that sheds
+        deliveries for ``reset_timeout`` seconds after that many consecutive
+        failures. ``retry`` overrides the bus-wide retry policy.
+
+        ``coalesce`` merges messages that queued up in a busy partition lane:
+        when the lane frees up, all of its waiting messages are passed to it
+        and the returned message is delivered once in their place. Replies to
+        a merged message should carry its ``correlation_ids`` list. With a
+        ``coalesce_key``, only consecutive messages sharing that field's value
+        are merged. Subscribing the same callback again replaces its settings.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        breaker = None
+        if failure_threshold is not None:
+            breaker = CircuitBreaker(failure_threshold, reset_timeout)
         if channel not in self._subscribers:
-            self._subscribers[channel] = set()
-        self._subscribers[channel].add(callback)
+            self._subscribers[channel] = {}
+        self._subscribers[channel][callback] = _Subscription(
+            callback, timeout, max_concurrency, breaker, retry, coalesce, coalesce_key
+        )
+
+    def has_subscribers(self, channel: str) -> bool:
+        return bool(self._subscribers.get(channel))
+
+    def unsubscribe(self, channel: str, callback: Callable[[dict], Awaitable[None]]):
+        """Removes a callback; deliveries already queued for it still run."""
+        subscribers = self._subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.pop(callback, None)
+            if not subscribers:
+                del self._subscribers[channel]
 
     async def stop(self):
         """Stops the message bus and its workers."""
         self._stop_event.set()
+        await self._scheduler.stop()
+        # Pending retries are dropped here; durable ones are replayed from the log.
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
         for worker in self._workers:
             worker.cancel()
         if self._workers:
             await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._command_log is not None:
+            await self._command_log.close()
         logger.info("Stopped message bus workers.")
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import aiosqlite
+import orjson
+
+from .group_commit import GroupCommit
+
+logger = logging.getLogger(__name__)
+
+CREATE_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS bus_log (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    message BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class CommandLog:
+    """
+    SQLite write-ahead log of bus messages, used to replay commands that were
+    queued or in flight when the process stopped.
+
+    Appends and acks are group-committed: they are buffered and written in a
+    single transaction every ``flush_interval`` seconds, or as soon as
+    ``max_batch`` appends are waiting. ``append()`` only returns once its
+    entry is committed; acks are fire-and-forget, so delivery is at least once.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.005, max_batch: int = 512):
+        self.path = path
+        self._db: Optional[aiosqlite.Connection] = None
+        self._next_id = 1
+        self._appends: List[Tuple[tuple, asyncio.Future]] = []
+        self._acks: List[Tuple[int]] = []
+        self._commits = GroupCommit(
+            self._flush, lambda: len(self._appends), flush_interval, max_batch
+        )
+        self._closed = False
+        # Entries left unacked by a previous run, handed out once by take_recovered().
+        self._recovered: List[Tuple[int, str, int, dict]] = []
+
+    async def open(self):
+        """Opens the log and loads unacked entries."""
+        if self._db is not None:
+            return
+        db = await aiosqlite.connect(self.path)
+        try:
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.executescript(CREATE_LOG_SQL)
+            await db.commit()
+            async with db.execute(
+                "SELECT id, channel, priority, message FROM bus_log ORDER BY id"
+            ) as cursor:
+                rows = await cursor.fetchall()
+        except Exception:
+            await db.close()
+            raise
+
+        def _parse_rows(rows_to_parse):
+            return [
+                (entry_id, channel, priority, orjson.loads(message))
+                for entry_id, channel, priority, message in rows_to_parse
+            ]
+
+        self._recovered = await asyncio.to_thread(_parse_rows, rows)
+        if rows:
+            self._next_id = rows[-1][0] + 1
+            logger.info(f"Recovered {len(rows)} unacked bus messages from {self.path}")
+        self._db = db
+        self._closed = False
+
+    def take_recovered(self) -> List[Tuple[int, str, int, dict]]:
+        """Returns the entries left over by the previous run, oldest first."""
+        recovered, self._recovered = self._recovered, []
+        return recovered
+
+    async def append(self, channel: str, message: dict, priority: int) -> int:
+        """Appends a message and waits until it is durable. Returns its entry id."""
+        if self._closed or self._db is None:
+            raise RuntimeError("Command log is not open")
+        entry_id = self._next_id
+        self._next_id += 1
+        row = (entry_id, channel, int(priority), orjson.dumps(message), time.time())
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((row, future))
+        self._commits.wake()
+        await future
+        return entry_id
+
+    def ack(self, entry_id: int):
+        """Marks an entry as handled; it is removed with the next commit."""
+        if self._closed:
+            return
+        self._acks.append((entry_id,))
+        self._commits.wake()
+
+    async def _flush(self):
+        appends, self._appends = self._appends, []
+        acks, self._acks = self._acks, []
+        if not appends and not acks:
+            return
+        try:
+            if appends:
+                await self._db.executemany(
+                    "INSERT INTO bus_log (id, channel, priority, message, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [row for row, _ in appends],
+                )
+            if acks:
+                await self._db.executemany("DELETE FROM bus_log WHERE id = ?", acks)
+            await self._db.commit()
+        except Exception as e:
+            logger.error(f"Failed to commit bus log batch: {e!r}")
+            try:
+                await self._db.rollback()
+            except Exception:
+                pass
+            for _, future in appends:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in appends:
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self):
+        """Flushes outstanding appends and acks, then closes the log."""
+        if self._db is None:
+            return
+        self._closed = True
+        await self._commits.stop()
+        # Acks that arrived during the last commit.
+        await self._flush()
+        await self._db.close()
+        self._db = None
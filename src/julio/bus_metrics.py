@@ -0,0 +1,253 @@
+import asyncio
+import bisect
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond dispatches up to multi-minute LLM turns.
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus-style cumulative buckets."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus the +Inf overflow slot.
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        """Returns the count of observations <= each bucket, ending with +Inf."""
+        total = 0
+        result = []
+        for count in self._counts:
+            total += count
+            result.append(total)
+        return result
+
+    def snapshot(self) -> dict:
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(bounds, self.cumulative())),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window of one-second slots."""
+
+    def __init__(self, window: int = 60, clock: Callable[[], float] = time.monotonic):
+        self._window = window
+        self._clock = clock
+        self._slots: Deque[List[int]] = deque()
+        self.total = 0
+
+    def mark(self, count: int = 1):
+        second = int(self._clock())
+        if self._slots and self._slots[-1][0] == second:
+            self._slots[-1][1] += count
+        else:
+            self._slots.append([second, count])
+            self._expire(second)
+        self.total += count
+
+    def _expire(self, now: int):
+        while self._slots and self._slots[0][0] <= now - self._window:
+            self._slots.popleft()
+
+    def rate(self) -> float:
+        self._expire(int(self._clock()))
+        return sum(count for _, count in self._slots) / self._window
+
+
+class ChannelMetrics:
+    """Counters, gauges and latency histograms for one bus channel."""
+
+    def __init__(self):
+        self.published = 0
+        self.enqueued = RateMeter()
+        self.dropped = 0
+        self.handled = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.shed = 0
+        self.expired = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.depth = 0
+        self.queue_wait = Histogram()
+        self.handler_duration = Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "published": self.published,
+            "enqueued": self.enqueued.total,
+            "enqueue_rate": self.enqueued.rate(),
+            "dropped": self.dropped,
+            "handled": self.handled,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "shed": self.shed,
+            "expired": self.expired,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "depth": self.depth,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "handler_duration_seconds": self.handler_duration.snapshot(),
+        }
+
+
+# (snapshot key, metric name, type, help) for per-channel counters and gauges.
+_CHANNEL_SERIES = (
+    ("published", "julio_bus_published_total", "counter", "Messages published."),
+    ("enqueued", "julio_bus_enqueued_total", "counter", "Deliveries queued for subscribers."),
+    ("enqueue_rate", "julio_bus_enqueue_rate", "gauge", "Deliveries queued per second over the last minute."),
+    ("dropped", "julio_bus_dropped_total", "counter", "Deliveries dropped because the queue was full."),
+    ("handled", "julio_bus_handled_total", "counter", "Deliveries handled without error."),
+    ("errors", "julio_bus_errors_total", "counter", "Deliveries whose subscriber raised or timed out."),
+    ("timeouts", "julio_bus_timeouts_total", "counter", "Deliveries cancelled by their subscriber timeout."),
+    ("shed", "julio_bus_shed_total", "counter", "Deliveries shed by an open circuit breaker."),
+    ("expired", "julio_bus_expired_total", "counter", "Deliveries skipped because their deadline had passed."),
+    ("coalesced", "julio_bus_coalesced_total", "counter", "Deliveries merged into another one waiting on the same lane."),
+    ("retries", "julio_bus_retries_total", "counter", "Failed deliveries scheduled for another attempt."),
+    ("dead_lettered", "julio_bus_dead_lettered_total", "counter", "Deliveries moved to the dead-letter store."),
+    ("depth", "julio_bus_queue_depth", "gauge", "Deliveries waiting to be handled."),
+)
+_CHANNEL_HISTOGRAMS = (
+    ("queue_wait_seconds", "julio_bus_queue_wait_seconds", "Time from publish to dispatch."),
+    ("handler_duration_seconds", "julio_bus_handler_duration_seconds", "Subscriber callback duration."),
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class BusMetrics:
+    """Per-channel metrics for a MessageBus, exportable as a dict or Prometheus text."""
+
+    def __init__(self):
+        self.channels: Dict[str, ChannelMetrics] = {}
+
+    def channel(self, name: str) -> ChannelMetrics:
+        metrics = self.channels.get(name)
+        if metrics is None:
+            metrics = self.channels[name] = ChannelMetrics()
+        return metrics
+
+    def snapshot(self, gauges: Optional[Dict[str, float]] = None) -> dict:
+        """Returns all channel metrics plus bus-wide ``gauges`` such as worker counts."""
+        return {
+            **(gauges or {}),
+            "channels": {
+                name: metrics.snapshot() for name, metrics in self.channels.items()
+            },
+        }
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE julio_bus_{name} gauge")
+            lines.append(f"julio_bus_{name} {value}")
+
+        snapshots = {
+            _escape(name): metrics.snapshot() for name, metrics in self.channels.items()
+        }
+        for key, metric, kind, help_text in _CHANNEL_SERIES:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for channel, snap in snapshots.items():
+                lines.append(f'{metric}{{channel="{channel}"}} {snap[key]}')
+
+        for key, metric, help_text in _CHANNEL_HISTOGRAMS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for channel, snap in snapshots.items():
+                histogram = snap[key]
+                for bound, count in histogram["buckets"].items():
+                    lines.append(
+                        f'{metric}_bucket{{channel="{channel}",le="{bound}"}} {count}'
+                    )
+                lines.append(f'{metric}_sum{{channel="{channel}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{channel="{channel}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Minimal local HTTP endpoint serving ``/metrics`` (Prometheus text) and
+    ``/metrics.json`` (snapshot dict) for a MessageBus.
+    """
+
+    def __init__(self, bus, host: str = "127.0.0.1", port: int = 9464):
+        self.bus = bus
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Report the bound port, which differs from the configured one for port 0.
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving bus metrics on http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Drain the headers; the request body is not used.
+            while (await asyncio.wait_for(reader.readline(), timeout=5.0)) not in (
+                b"\r\n",
+                b"\n",
+                b"",
+            ):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path == "/metrics":
+                status = "200 OK"
+                content_type = "text/plain; version=0.0.4"
+                body = self.bus.render_metrics().encode()
+            elif path == "/metrics.json":
+                status = "200 OK"
+                content_type = "application/json"
+                body = orjson.dumps(self.bus.metrics_snapshot())
+            else:
+                status = "404 Not Found"
+                content_type = "text/plain"
+                body = b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving bus metrics: {e!r}")
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid cron step: {step_text}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            # "5/15" means every 15 starting at 5.
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field {field!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression (minute hour day-of-month month
+    day-of-week), evaluated in UTC. Fields accept ``*``, numbers, ranges,
+    lists and ``/step``. Day-of-week runs 0-6 from Sunday; 7 is also Sunday.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = frozenset(d % 7 for d in _parse_cron_field(fields[4], 0, 7))
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.isoweekday() % 7) in self.weekdays
+        # As in cron, a restricted day-of-month and day-of-week match either.
+        if not self._any_day and not self._any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        """Returns the first matching minute strictly after ``timestamp``."""
+        dt = datetime.fromtimestamp(timestamp, timezone.utc).replace(
+            second=0, microsecond=0
+        ) + timedelta(minutes=1)
+        # Jump a whole field at a time; five years covers every valid expression.
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+@dataclass(slots=True)
+class ScheduledMessage:
+    """A pending one-shot or recurring publication."""
+
+    id: str
+    channel: str
+    message: dict
+    priority: int
+    due_at: float
+    interval: Optional[float] = None
+    cron: Optional[str] = None
+
+    def next_due(self, now: float) -> Optional[float]:
+        """Returns the next due time after firing, or None for one-shot timers."""
+        if self.interval is not None:
+            # Keep the original cadence, skipping runs missed while we were down.
+            due = self.due_at + self.interval
+            if due <= now:
+                due = now + self.interval - ((now - self.due_at) % self.interval)
+            return due
+        if self.cron is not None:
+            return CronSchedule(self.cron).next_after(now)
+        return None
+
+    def to_record(self) -> dict:
+        return {
+            "id": self.id,
+            "channel": self.channel,
+            "message": self.message,
+            "priority": self.priority,
+            "due_at": self.due_at,
+            "interval": self.interval,
+            "cron": self.cron,
+        }
+
+
+class TimerScheduler:
+    """
+    Delivers scheduled messages through a publish callback.
+
+    Pending timers live in a heap ordered by due time and a single task sleeps
+    until the earliest one, so each timer costs one heap entry rather than a
+    sleeping task. Cancelled timers are dropped lazily when they reach the top.
+    With a ``store`` (e.g. Persistence), timers survive restarts; ones that
+    fell due while the service was down fire once on start.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, dict, int], Awaitable[bool]],
+        store=None,
+    ):
+        self._publish = publish
+        self._store = store
+        self._timers: Dict[str, ScheduledMessage] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        if self._store is not None:
+            for record in await self._store.list_scheduled_messages():
+                self._push(ScheduledMessage(**record))
+            if self._timers:
+                logger.info(f"Restored {len(self._timers)} scheduled bus messages.")
+        self._task = asyncio.create_task(self._run())
+
+    def _push(self, timer: ScheduledMessage):
+        self._timers[timer.id] = timer
+        self._seq += 1
+        entry = (timer.due_at, self._seq, timer.id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # New earliest timer, the sleeper has to re-arm.
+            self._wakeup.set()
+
+    async def schedule(
+        self,
+        channel: str,
+        message: dict,
+        due_at: float,
+        priority: int,
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+    ) -> str:
+        """Adds a timer and returns its id."""
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be positive")
+        if cron is not None:
+            CronSchedule(cron)  # Validate early.
+        timer = ScheduledMessage(
+            uuid.uuid4().hex, channel, message, int(priority), due_at, interval, cron
+        )
+        if self._store is not None:
+            await self._store.save_scheduled_message(timer.to_record())
+        self._push(timer)
+        return timer.id
+
+    async def cancel(self, timer_id: str) -> bool:
+        """Cancels a pending timer. Returns False if it was unknown or already fired."""
+        timer = self._timers.pop(timer_id, None)
+        if timer is None:
+            return False
+        if self._store is not None:
+            await self._store.delete_scheduled_message(timer_id)
+        return True
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            while self._heap and self._heap[0][2] not in self._timers:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            due_at, _, timer_id = heapq.heappop(self._heap)
+            timer = self._timers.get(timer_id)
+            if timer is None or timer.due_at != due_at:
+                continue
+            await self._fire(timer)
+
+    async def _fire(self, timer: ScheduledMessage):
+        now = time.time()
+        next_due = timer.next_due(now)
+        try:
+            if next_due is None:
+                del self._timers[timer.id]
+                if self._store is not None:
+                    await self._store.delete_scheduled_message(timer.id)
+            else:
+                timer.due_at = next_due
+                if self._store is not None:
+                    await self._store.save_scheduled_message(timer.to_record())
+                self._push(timer)
+            await self._publish(timer.channel, dict(timer.message), timer.priority)
+        except Exception as e:
+            logger.error(f"Error firing scheduled message {timer.id}: {e!r}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,517 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import os
+import struct
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import orjson
+
+from .bus import Priority
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class RemoteHandlerError(Exception):
+    """A subscriber in another process failed to handle a delivery."""
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Reads one length-prefixed orjson frame. Returns None at end of stream."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Bus frame of {size} bytes exceeds the limit")
+    return orjson.loads(await reader.readexactly(size))
+
+
+def encode_frame(frame: dict) -> bytes:
+    body = orjson.dumps(frame)
+    return _HEADER.pack(len(body)) + body
+
+
+class _Connection:
+    """
+    A framed stream whose writes are batched: frames queued during one loop
+    iteration go out in a single write and drain.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._buffer: List[bytes] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        # Frames waiting for an answer from the other side, by frame id.
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.is_closing()
+
+    def send(self, frame: dict):
+        if self.closed:
+            raise ConnectionError("Bus connection is closed")
+        self._buffer.append(encode_frame(frame))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush())
+
+    async def call(self, frame: dict):
+        """Sends a frame tagged with a fresh id and waits for its answer."""
+        frame_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[frame_id] = future
+        try:
+            self.send({**frame, "id": frame_id})
+            return await future
+        finally:
+            self.pending.pop(frame_id, None)
+
+    def resolve(self, frame: dict):
+        future = self.pending.get(frame.get("id"))
+        if future is None or future.done():
+            return
+        if frame.get("error") is not None:
+            future.set_exception(RemoteHandlerError(frame["error"]))
+        else:
+            future.set_result(frame.get("result"))
+
+    async def _flush(self):
+        try:
+            # Let the other senders of this iteration join the batch.
+            await asyncio.sleep(0)
+            while self._buffer:
+                data, self._buffer = b"".join(self._buffer), []
+                self.writer.write(data)
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Bus connection lost while writing: {e!r}")
+            self.close()
+        finally:
+            self._flusher = None
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+        self._buffer.clear()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Bus connection closed"))
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes. Adding or removing a node only
+    moves the keys that hashed to that node's points.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self._replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self._replicas):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def lookup(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring is empty")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class _ConsumerGroup:
+    """
+    Remote subscribers competing for the deliveries of one bus subscription.
+    With a ``route_key``, messages are sharded over the named members by
+    consistent hash of that field; otherwise the least busy member wins.
+    """
+
+    def __init__(
+        self,
+        bus,
+        channel: str,
+        route_key: Optional[str] = None,
+        group: Optional[str] = None,
+    ):
+        self.bus = bus
+        self.channel = channel
+        self.route_key = route_key
+        self.group = group
+        self.members: List[_Connection] = []
+        self._names: Dict[str, _Connection] = {}
+        self._ring = HashRing()
+        self._in_flight: Dict[_Connection, int] = {}
+
+    def add(self, conn: _Connection, name: Optional[str]):
+        if conn in self.members:
+            return
+        name = name or f"conn-{id(conn)}"
+        stale = self._names.get(name)
+        if stale is not None:
+            # A restarted member reclaims its name, and with it its shard.
+            self.members.remove(stale)
+        self.members.append(conn)
+        self._names[name] = conn
+        self._ring.add(name)
+
+    def remove(self, conn: _Connection):
+        if conn not in self.members:
+            return
+        self.members.remove(conn)
+        for name, member in list(self._names.items()):
+            if member is conn:
+                del self._names[name]
+                self._ring.remove(name)
+        logger.info(
+            f"Consumer left {self.channel}; {len(self.members)} members remain."
+        )
+
+    def _pick(self, message: dict) -> _Connection:
+        if self.route_key is not None:
+            key = str(message.get(self.route_key, ""))
+            return self._names[self._ring.lookup(key)]
+        # Least-loaded member; ties go to the first one registered.
+        return min(self.members, key=lambda m: self._in_flight.get(m, 0))
+
+    async def deliver(self, message: dict):
+        if not self.members:
+            raise ConnectionError(f"No remote subscribers left on {self.channel}")
+        member = self._pick(message)
+        self._in_flight[member] = self._in_flight.get(member, 0) + 1
+        try:
+            await member.call(
+                {
+                    "op": "deliver",
+                    "channel": self.channel,
+                    "group": self.group,
+                    "message": message,
+                }
+            )
+        finally:
+            self._in_flight[member] -= 1
+            if not self._in_flight[member]:
+                del self._in_flight[member]
+
+
+class BusServer:
+    """
+    Exposes a MessageBus to other processes on a Unix domain socket.
+
+    Clients (see RemoteBus) publish into the bus and subscribe to channels.
+    Subscribers sharing a ``group`` compete for messages, each delivered to
+    the least busy member, or sharded by consistent hash of the group's
+    ``route_key`` over its named members; ungrouped subscribers each receive
+    every message.
+    A delivery completes when the remote callback acks it, so lanes, timeouts,
+    retries and the command log behave as for local subscribers.
+    """
+
+    def __init__(self, bus, path: str):
+        self.bus = bus
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._groups: Dict[tuple, _ConsumerGroup] = {}
+        self._connections: Dict[_Connection, asyncio.Task] = {}
+        self._publishes: set = set()
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+        logger.info(f"Serving message bus on {self.path}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = _Connection(reader, writer)
+        self._connections[conn] = asyncio.current_task()
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                op = frame.get("op")
+                if op == "ack":
+                    conn.resolve(frame)
+                elif op == "publish":
+                    # Publishing may wait for capacity; keep reading acks meanwhile.
+                    task = asyncio.create_task(self._publish(conn, frame))
+                    self._publishes.add(task)
+                    task.add_done_callback(self._publishes.discard)
+                elif op == "subscribe":
+                    await self._subscribe(conn, frame)
+                else:
+                    logger.warning(f"Unknown bus frame op: {op!r}")
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Bus client disconnected: {e!r}")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.pop(conn, None)
+            self._drop(conn)
+            conn.close()
+
+    async def _publish(self, conn: _Connection, frame: dict):
+        try:
+            result = await self.bus.publish_response(
+                frame["channel"],
+                frame["message"],
+                Priority(frame.get("priority", Priority.NORMAL)),
+                wait=frame.get("wait", False),
+                timeout=frame.get("timeout"),
+            )
+            reply = {"op": "ack", "id": frame["id"], "result": result}
+        except Exception as e:
+            reply = {"op": "ack", "id": frame["id"], "error": repr(e)}
+        if not conn.closed:
+            conn.send(reply)
+
+    async def _subscribe(self, conn: _Connection, frame: dict):
+        channel = frame["channel"]
+        # Without a group every connection gets its own copy of each message.
+        key = (channel, frame.get("group") or id(conn))
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _ConsumerGroup(
+                self.bus, channel, frame.get("route_key"), frame.get("group")
+            )
+            await self.bus.subscribe_to_commands(
+                channel,
+                group.deliver,
+                timeout=frame.get("timeout"),
+                max_concurrency=frame.get("max_concurrency"),
+            )
+        group.add(conn, frame.get("member"))
+        conn.send({"op": "ack", "id": frame["id"], "result": True})
+
+    def _drop(self, conn: _Connection):
+        for key, group in list(self._groups.items()):
+            group.remove(conn)
+            # Named groups keep their subscription while members restart, so
+            # deliveries fail over to the retry policy instead of vanishing.
+            if not group.members and not isinstance(key[1], str):
+                self.bus.unsubscribe(group.channel, group.deliver)
+                del self._groups[key]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        tasks = [*self._connections.values(), *self._publishes]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class RemoteBus:
+    """
+    Client for a BusServer with the MessageBus publish/subscribe API.
+
+    Publishes are spread over a pool of ``pool_size`` connections that are
+    re-dialled when they break. Subscriptions live on their own connection,
+    which reconnects with backoff and re-subscribes.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, reconnect_delay: float = 0.5):
+        self.path = path
+        self._pool: List[Optional[_Connection]] = [None] * pool_size
+        # Connects in progress per pool slot, shared by everyone waiting on it.
+        self._dialing: List[Optional[asyncio.Task]] = [None] * pool_size
+        self._next = itertools.count()
+        self._reconnect_delay = reconnect_delay
+        self._subscriptions: Dict[tuple, dict] = {}
+        self._callbacks: Dict[tuple, Callable[[dict], Awaitable[None]]] = {}
+        self._sub_conn: Optional[_Connection] = None
+        # Subscriptions already sent on the current subscription connection.
+        self._sent: set = set()
+        self._sub_ready = asyncio.Event()
+        self._tasks: set = set()
+        self._closed = False
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        conn = _Connection(reader, writer)
+        self._spawn(self._read_loop(conn))
+        return conn
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def start(self):
+        self._closed = False
+        self._spawn(self._subscription_loop())
+
+    async def _read_loop(self, conn: _Connection):
+        try:
+            while (frame := await read_frame(conn.reader)) is not None:
+                if frame.get("op") == "deliver":
+                    self._spawn(self._run_callback(conn, frame))
+                else:
+                    conn.resolve(frame)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(f"Lost bus connection to {self.path}: {e!r}")
+        finally:
+            conn.close()
+
+    async def _run_callback(self, conn: _Connection, frame: dict):
+        callback = self._callbacks.get((frame["channel"], frame.get("group")))
+        error = None
+        try:
+            if callback is None:
+                raise LookupError(f"No subscriber for channel {frame['channel']}")
+            await callback(frame["message"])
+        except Exception as e:
+            error = repr(e)
+            logger.error(f"Error in remote bus subscriber: {e!r}")
+        if not conn.closed:
+            conn.send({"op": "ack", "id": frame["id"], "error": error})
+
+    async def _subscription_loop(self):
+        delay = self._reconnect_delay
+        while not self._closed:
+            conn = None
+            try:
+                conn = await self._connect()
+                self._sent = set()
+                # Subscribing callers may add entries while this one awaits.
+                for key, frame in list(self._subscriptions.items()):
+                    self._sent.add(key)
+                    await conn.call(frame)
+            except (ConnectionError, OSError) as e:
+                logger.warning(f"Cannot subscribe on {self.path}: {e!r}")
+            except Exception as e:
+                logger.error(f"Error subscribing on {self.path}: {e!r}")
+            else:
+                self._sub_conn = conn
+                self._sub_ready.set()
+                delay = self._reconnect_delay
+                try:
+                    await conn.writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+                self._sub_ready.clear()
+                self._sub_conn = None
+                continue
+            if conn is not None:
+                conn.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _pooled(self) -> _Connection:
+        slot = next(self._next) % len(self._pool)
+        conn = self._pool[slot]
+        if conn is not None and not conn.closed:
+            return conn
+        dialing = self._dialing[slot]
+        if dialing is None:
+            dialing = self._dialing[slot] = self._spawn(self._dial(slot))
+        # A cancelled publisher must not abort the connect for the others.
+        return await asyncio.shield(dialing)
+
+    async def _dial(self, slot: int) -> _Connection:
+        try:
+            conn = self._pool[slot] = await self._connect()
+            return conn
+        finally:
+            self._dialing[slot] = None
+
+    async def publish_response(
+        self,
+        channel: str,
+        message: dict,
+        priority: Priority = Priority.NORMAL,
+        *,
+        wait: bool = False,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """Publishes through the server's bus. Returns False if it was dropped."""
+        conn = await self._pooled()
+        frame = {
+            "op": "publish",
+            "channel": channel,
+            "message": message,
+            "priority": int(priority),
+            "wait": wait,
+            "timeout": timeout,
+        }
+        return await conn.call(frame)
+
+    async def subscribe_to_commands(
+        self,
+        channel: str,
+        callback: Callable[[dict], Awaitable[None]],
+        *,
+        group: Optional[str] = None,
+        member: Optional[str] = None,
+        route_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        """
+        Subscribes ``callback`` to a channel of the server's bus. Processes
+        using the same ``group`` share the channel's messages between them;
+        with a ``route_key`` each message goes to the ``member`` its value
+        hashes to, so e.g. one session always lands on the same process.
+        """
+        frame = {
+            "op": "subscribe",
+            "channel": channel,
+            "group": group,
+            "member": member,
+            "route_key": route_key,
+            "timeout": timeout,
+            "max_concurrency": max_concurrency,
+        }
+        key = (channel, group)
+        self._callbacks[key] = callback
+        self._subscriptions[key] = frame
+        await self._sub_ready.wait()
+        # The subscription loop may have sent it already while (re)connecting.
+        if key not in self._sent:
+            self._sent.add(key)
+            await self._sub_conn.call(frame)
+
+    async def stop(self):
+        self._closed = True
+        for conn in [*self._pool, self._sub_conn]:
+            if conn is not None:
+                conn.close()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import List, Optional, Literal
+from typing import Annotated, Dict, List, Optional, Literal
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -18,11 +18,105 @@ class AgentConfig(BaseSettings):
     mcp_servers: List[MCPServerConfig] = Field(default_factory=list)
     skills_path: str = "./skills"
     db_path: str = "agent.db"
+    # Read-only SQLite connections for history and session reads (0 = use the writer).
+    db_read_pool_size: int = Field(default=4, ge=0)
+    # SQLite page cache and memory-mapped I/O per connection, in MiB.
+    db_cache_size_mb: int = 16
+    db_mmap_size_mb: int = 256
+    # Group-commit session and event writes every this many ms, or once
+    # db_write_batch_max are waiting; None commits each write on its own.
+    db_write_batch_interval_ms: Optional[float] = 2.0
+    db_write_batch_max: int = 256
+    # Parsed recent events kept in memory per (session_id, user_id), bounded by
+    # session count and encoded bytes; 0 sessions (the default) disables the
+    # cache. Only worth enabling when something calls Persistence.get_history.
+    history_cache_max_sessions: int = Field(default=0, ge=0)
+    history_cache_max_bytes: Optional[int] = 64 * 1024 * 1024
+    history_cache_max_events: int = 50
+    # Compress stored event_data ("zlib"); reads decode it either way.
+    db_compression: Optional[Literal["zlib"]] = None
+    db_compression_level: int = 6
+    # Events smaller than this stay plain JSON.
+    db_compression_min_bytes: int = 256
+    # zlib preset dictionaries (Persistence.train_compression_dict): the first
+    # is used for writing, the others only to read rows written with them.
+    db_compression_dict_paths: List[str] = Field(default_factory=list)
     heartbeat_interval_minutes: float = 5.0
+    heartbeat_enabled: bool = True
+    # Random offset applied to each heartbeat, as a fraction of the interval.
+    heartbeat_jitter: float = 0.1
+    # Skip a heartbeat while the bus or agent_commands is at least this busy.
+    heartbeat_max_queue_depth: int = 10
+    heartbeat_max_in_flight: int = 4
     shell_command_timeout: float = 30.0
     bus_max_tasks: int = 50
+    bus_min_tasks: int = 1
+    # Workers above bus_min_tasks exit after this long without work.
+    bus_worker_idle_timeout_seconds: float = 60.0
+    # Queue wait after which the bus adds a worker even if depth looks fine.
+    bus_scale_up_wait_seconds: float = 0.1
     bus_max_queue_size: int = 10000
+    # Message field used to keep per-session commands in order; None disables it.
+    bus_partition_key: Optional[str] = "source_id"
+    # Times a waiting lower-priority message may be passed over before it is served.
+    bus_starvation_limit: int = 8
+    # Message field used to share bus throughput fairly; None means plain FIFO.
+    bus_fair_key: Optional[str] = "user_id"
+    # Relative dispatch weights per fair-key value (default weight is 1.0).
+    bus_fair_weights: Dict[str, float] = Field(default_factory=dict)
+    # Queue fill ratios at which the bus reports congestion and recovery.
+    bus_high_watermark: float = 0.8
+    bus_low_watermark: float = 0.5
+    # SQLite write-ahead log for durable channels; None keeps the bus in-memory only.
+    bus_wal_path: Optional[str] = None
+    bus_durable_channels: List[str] = Field(default_factory=lambda: ["agent_commands"])
+    bus_wal_flush_interval_ms: float = 5.0
+    bus_wal_max_batch: int = 512
+    # Cancel an agent_commands turn that runs longer than this; None waits forever.
+    command_handler_timeout_seconds: Optional[float] = None
+    # Agent turns allowed in flight at once; more are rejected immediately. None = no limit.
+    max_concurrent_turns: Optional[int] = None
+    # Per-user token bucket: sustained commands per minute and burst size. None = no limit.
+    user_rate_limit_per_minute: Optional[float] = Field(default=None, gt=0)
+    user_rate_burst: int = Field(default=5, ge=1)
+    # Per-user overrides of user_rate_limit_per_minute, keyed by user_id.
+    user_rate_limits_per_minute: Dict[str, Annotated[float, Field(gt=0)]] = Field(
+        default_factory=dict
+    )
+    # Independent Runner/LlmAgent instances that turns of different sessions run on.
+    runner_pool_size: int = Field(default=1, ge=1)
+    # Publish partial agent_responses chunks as the model streams, then the full reply.
+    stream_responses: bool = False
+    # Merge commands that queue up behind a busy session into one follow-up turn.
+    coalesce_commands: bool = False
+    # Skip agent_commands older than this instead of running a stale turn; None keeps them.
+    command_ttl_seconds: Optional[float] = None
+    # Dead-letter expired commands instead of dropping them.
+    command_dead_letter_expired: bool = False
+    # Attempts per agent_commands message before it is dead-lettered.
+    command_retry_max_attempts: int = 3
+    command_retry_base_delay_seconds: float = 1.0
+    command_retry_max_delay_seconds: float = 30.0
+    # Where dead letters are kept: "memory" (bounded) or "persistent" (db_path).
+    bus_dead_letter_store: Literal["memory", "persistent"] = "memory"
+    bus_dead_letter_max: int = 10000
+    # Keep scheduled bus messages in db_path so they survive restarts.
+    bus_persist_schedules: bool = False
+    # Worker processes started by julio-supervisor; None uses one per CPU.
+    supervisor_workers: Optional[int] = None
+    # Unix socket exposing the bus to other processes (see RemoteBus); None disables it.
+    bus_socket_path: Optional[str] = None
     mcp_keep_alive_interval_seconds: float = 300.0
+    # Local port for the bus metrics endpoint; None disables it.
+    metrics_port: Optional[int] = None
+    metrics_host: str = "127.0.0.1"
+    # Local HTTP/SSE/WebSocket gateway to the bus; None disables it.
+    gateway_port: Optional[int] = None
+    gateway_host: str = "127.0.0.1"
+    # Responses buffered per streaming client before the oldest are dropped.
+    gateway_client_buffer: int = 256
+    gateway_keepalive_seconds: float = 15.0
+    gateway_request_timeout_seconds: float = 30.0
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
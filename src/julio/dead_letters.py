@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+
+class InMemoryDeadLetterStore:
+    """Bounded in-memory dead-letter store; the oldest letters are evicted first."""
+
+    def __init__(self, max_letters: int = 10000):
+        self._max_letters = max_letters
+        self._letters: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 1
+
+    async def add(self, letter: dict) -> int:
+        letter_id = self._next_id
+        self._next_id += 1
+        self._letters[letter_id] = {**letter, "id": letter_id}
+        while len(self._letters) > self._max_letters:
+            self._letters.popitem(last=False)
+        return letter_id
+
+    async def list(
+        self, channel: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[dict]:
+        """Returns dead letters oldest first, optionally for one channel only."""
+        letters = [
+            letter
+            for letter in self._letters.values()
+            if channel is None or letter["channel"] == channel
+        ]
+        return letters if limit is None else letters[:limit]
+
+    async def remove(self, ids: Iterable[int]):
+        for letter_id in ids:
+            self._letters.pop(letter_id, None)
+
+
+class PersistentDeadLetterStore:
+    """Dead-letter store kept in the agent database through Persistence."""
+
+    def __init__(self, persistence):
+        self.persistence = persistence
+
+    async def add(self, letter: dict) -> int:
+        return await self.persistence.add_dead_letter(letter)
+
+    async def list(
+        self, channel: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[dict]:
+        return await self.persistence.list_dead_letters(channel, limit)
+
+    async def remove(self, ids: Iterable[int]):
+        await self.persistence.delete_dead_letters(list(ids))
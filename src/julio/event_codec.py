@@ -0,0 +1,132 @@
+import abc
+import hashlib
+import re
+import sqlite3
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Union
+
+# Leads every encoded event_data value; JSON text can never start with 0xff.
+MAGIC = b"\xffJE"
+# Encoded values are MAGIC, a 4-byte big-endian codec id, then the payload.
+_ID_BYTES = 4
+_HEADER = len(MAGIC) + _ID_BYTES
+
+_FRAGMENT = re.compile(rb'"[^"\\]{1,48}"\s*:?\s*')
+
+
+class EventCodec(abc.ABC):
+    """
+    Compresses stored ``events.event_data``. Encoded values are
+    ``MAGIC + codec_id + payload`` blobs, so they can be told apart from
+    plain JSON rows and from other codecs. ``codec_id`` is a 32-bit id that
+    must identify everything needed to decompress, e.g. a dictionary.
+    """
+
+    codec_id: int
+
+    @abc.abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class ZlibCodec(EventCodec):
+    """
+    zlib, optionally primed with a preset dictionary (see ``train_zdict``)
+    so that small events, which share most of their keys, compress too.
+    Each dictionary gets its own codec id, so rows written with an older one
+    stay readable while it is still registered.
+    """
+
+    def __init__(self, level: int = 6, zdict: Optional[bytes] = None):
+        self.level = level
+        self.zdict = zdict
+        self.codec_id = 1
+        if zdict:
+            # The high bit keeps dictionary ids clear of the built-in ones.
+            digest = hashlib.blake2b(zdict, digest_size=_ID_BYTES).digest()
+            self.codec_id = int.from_bytes(digest, "big") | 0x80000000
+
+    def __eq__(self, other) -> bool:
+        # The level only matters when compressing; any level decodes.
+        return isinstance(other, ZlibCodec) and self.zdict == other.zdict
+
+    def __hash__(self) -> int:
+        return hash(self.zdict)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.zdict:
+            compressor = zlib.compressobj(self.level, zdict=self.zdict)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.zdict:
+            decompressor = zlib.decompressobj(zdict=self.zdict)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+def train_zdict(samples: Iterable[Union[str, bytes]], size: int = 32 * 1024) -> bytes:
+    """
+    Builds a zlib preset dictionary from sample events: the most frequent
+    JSON keys and short strings, the most common last, where zlib finds
+    them at the shortest distance.
+    """
+    counts: Counter = Counter()
+    for sample in samples:
+        if isinstance(sample, str):
+            sample = sample.encode()
+        counts.update(_FRAGMENT.findall(sample))
+    chosen = []
+    total = 0
+    for fragment, count in counts.most_common():
+        if count < 2 or total + len(fragment) > size:
+            continue
+        chosen.append(fragment)
+        total += len(fragment)
+    return b"".join(reversed(chosen))
+
+
+def encode(
+    data: Union[str, bytes], codec: EventCodec, min_size: int = 256
+) -> Union[str, bytes]:
+    """Encodes ``data`` with ``codec``, or returns it as is when that doesn't pay off."""
+    raw = data.encode() if isinstance(data, str) else data
+    if len(raw) < min_size:
+        return data
+    packed = MAGIC + codec.codec_id.to_bytes(_ID_BYTES, "big") + codec.compress(raw)
+    return packed if len(packed) < len(raw) else data
+
+
+def decode(value, codecs: Dict[int, EventCodec]):
+    """Returns the JSON of an encoded value; anything else is returned as is."""
+    if type(value) is not bytes or not value.startswith(MAGIC):
+        return value
+    codec_id = int.from_bytes(value[len(MAGIC) : _HEADER], "big")
+    codec = codecs.get(codec_id)
+    if codec is None:
+        raise ValueError(f"No event codec registered for id {codec_id:#x}")
+    return codec.decompress(value[_HEADER:])
+
+
+def decoding_row_factory(codecs: Dict[int, EventCodec]):
+    """
+    sqlite3.Row factory that transparently decodes encoded columns, so the
+    work happens on the connection's thread rather than the event loop.
+    """
+
+    def factory(cursor: sqlite3.Cursor, row: tuple) -> sqlite3.Row:
+        for value in row:
+            if type(value) is bytes and value.startswith(MAGIC):
+                row = tuple(decode(v, codecs) for v in row)
+                break
+        return sqlite3.Row(cursor, row)
+
+    return factory
@@ -0,0 +1,416 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import struct
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+from .bus import Priority
+
+logger = logging.getLogger(__name__)
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_STATUS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+# Queued by the keep-alive ticker; streams turn it into an SSE comment or ping.
+_KEEPALIVE = object()
+# Command fields the agent reads as text; absent ones get its defaults.
+_TEXT_FIELDS = ("source_id", "user_id", "content")
+# Set by the bus and the agent. From a client they could steal other callers'
+# replies or pin a command's deadline.
+_RESERVED_FIELDS = ("correlation_id", "correlation_ids", "deadline", "partial")
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _command_error(command) -> Optional[str]:
+    """Why a client's command cannot be published, or None if it can."""
+    if not isinstance(command, dict):
+        return "Command must be a JSON object"
+    for key in _TEXT_FIELDS:
+        if key in command and not isinstance(command[key], str):
+            return f"{key} must be a string"
+    reserved = [key for key in _RESERVED_FIELDS if key in command]
+    if reserved:
+        return f"Reserved fields: {', '.join(reserved)}"
+    return None
+
+
+class _Stream:
+    """A streaming client and its bounded buffer of undelivered responses."""
+
+    def __init__(self, source_id: Optional[str], max_buffer: int):
+        self.source_id = source_id
+        self.queue: asyncio.Queue = asyncio.Queue(max_buffer)
+        self.dropped = 0
+
+    def offer(self, item):
+        if self.queue.full():
+            # A slow reader loses its oldest responses rather than stalling the bus.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+
+class Gateway:
+    """
+    Local HTTP gateway to the message bus.
+
+    ``POST /commands`` publishes a JSON command on ``agent_commands``; with
+    ``?wait=1`` it returns the agent's reply instead of 202. Responses on
+    ``agent_responses`` are streamed to ``GET /events?source_id=...`` (SSE)
+    and ``GET /ws?source_id=...`` (WebSocket, which also accepts commands as
+    text frames); without ``source_id`` a stream receives every response.
+
+    Connections are kept alive and pipelined requests are answered in order.
+    Each stream has a bounded buffer that drops its oldest responses when the
+    client falls behind. Idle streams wait on their buffer; a single ticker
+    sends keep-alives to all of them.
+    """
+
+    def __init__(
+        self,
+        bus,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        *,
+        client_buffer: int = 256,
+        keepalive_interval: float = 15.0,
+        idle_timeout: float = 60.0,
+        request_timeout: float = 30.0,
+        max_body: int = 1024 * 1024,
+    ):
+        self.bus = bus
+        self.host = host
+        self.port = port
+        self._client_buffer = client_buffer
+        self._keepalive_interval = keepalive_interval
+        self._idle_timeout = idle_timeout
+        self._request_timeout = request_timeout
+        self._max_body = max_body
+        # Streams by source_id; None holds the ones that receive everything.
+        self._streams: Dict[Optional[str], Set[_Stream]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._connections: Set[asyncio.Task] = set()
+
+    @property
+    def stream_count(self) -> int:
+        return sum(len(streams) for streams in self._streams.values())
+
+    async def start(self):
+        await self.bus.subscribe_to_commands("agent_responses", self._on_response)
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        # Report the bound port, which differs from the configured one for port 0.
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ticker = asyncio.create_task(self._keepalive_loop())
+        logger.info(f"Serving gateway on http://{self.host}:{self.port}")
+
+    async def _on_response(self, message: dict):
+        for key in (message.get("source_id"), None):
+            for stream in self._streams.get(key, ()):
+                stream.offer(message)
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self._keepalive_interval)
+            for streams in self._streams.values():
+                for stream in streams:
+                    if stream.queue.empty():
+                        stream.offer(_KEEPALIVE)
+
+    def _register(self, source_id: Optional[str]) -> _Stream:
+        stream = _Stream(source_id, self._client_buffer)
+        self._streams.setdefault(source_id, set()).add(stream)
+        return stream
+
+    def _unregister(self, stream: _Stream):
+        streams = self._streams.get(stream.source_id)
+        if streams is not None:
+            streams.discard(stream)
+            if not streams:
+                del self._streams[stream.source_id]
+        if stream.dropped:
+            logger.warning(
+                f"Gateway stream for {stream.source_id} dropped {stream.dropped} responses"
+            )
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(asyncio.current_task())
+        try:
+            # Pipelined requests are read and answered one after another.
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), timeout=self._idle_timeout
+                    )
+                except _BadRequest as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if path == "/events" and method == "GET":
+                    await self._serve_sse(writer, query.get("source_id"))
+                    break
+                if path == "/ws" and method == "GET":
+                    await self._serve_websocket(
+                        reader, writer, headers, query.get("source_id")
+                    )
+                    break
+                status, payload = await self._route(method, path, query, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error serving gateway client: {e!r}")
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise _BadRequest(400, "Incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(431, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        if len(parts) != 3:
+            raise _BadRequest(400, "Malformed request line")
+        method, target, _ = parts
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        raw_length = headers.get("content-length") or "0"
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            raise _BadRequest(400, "Invalid Content-Length")
+        length = int(raw_length)
+        if length > self._max_body:
+            raise _BadRequest(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, url.path, query, headers, body
+
+    async def _respond(
+        self, writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool
+    ):
+        body = orjson.dumps(payload)
+        writer.write(
+            f"HTTP/1.1 {status} {_STATUS[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, query: Dict[str, str], body: bytes):
+        if path == "/healthz":
+            return 200, {"status": "ok", "streams": self.stream_count}
+        if path != "/commands":
+            return 404, {"error": "Not Found"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            command = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return 400, {"error": "Body must be JSON"}
+        error = _command_error(command)
+        if error is not None:
+            return 400, {"error": error}
+        return await self._submit(command, query.get("wait") in ("1", "true"))
+
+    async def _submit(self, command: dict, wait_for_reply: bool):
+        if wait_for_reply:
+            try:
+                reply = await self.bus.request(
+                    "agent_commands",
+                    command,
+                    timeout=self._request_timeout,
+                    priority=Priority.INTERACTIVE,
+                )
+            except asyncio.QueueFull:
+                return 503, {"error": "Agent is overloaded"}
+            except TimeoutError:
+                return 504, {"error": "No reply in time"}
+            return 200, reply
+        accepted = await self.bus.publish_response(
+            "agent_commands",
+            command,
+            Priority.INTERACTIVE,
+            wait=True,
+            timeout=self._request_timeout,
+        )
+        if not accepted:
+            return 503, {"error": "Agent is overloaded"}
+        return 202, {"accepted": True}
+
+    async def _serve_sse(self, writer: asyncio.StreamWriter, source_id: Optional[str]):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+        )
+        await writer.drain()
+        stream = self._register(source_id)
+        try:
+            while True:
+                item = await stream.queue.get()
+                if item is _KEEPALIVE:
+                    writer.write(b": keep-alive\n\n")
+                else:
+                    writer.write(b"data: " + orjson.dumps(item) + b"\n\n")
+                await writer.drain()
+        finally:
+            self._unregister(stream)
+
+    async def _serve_websocket(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: Dict[str, str],
+        source_id: Optional[str],
+    ):
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            await self._respond(writer, 400, {"error": "Expected a WebSocket upgrade"}, False)
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode() + _WS_GUID).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        await writer.drain()
+        stream = self._register(source_id)
+        sender = asyncio.create_task(self._ws_send_loop(writer, stream))
+        try:
+            while True:
+                opcode, payload = await read_ws_message(reader, self._max_body)
+                if opcode == 0x8:
+                    writer.write(encode_ws_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:
+                    writer.write(encode_ws_frame(0xA, payload))
+                elif opcode == 0x1:
+                    stream.offer(await self._ws_command(payload, source_id))
+        finally:
+            sender.cancel()
+            self._unregister(stream)
+
+    async def _ws_command(self, payload: bytes, source_id: Optional[str]) -> dict:
+        try:
+            command = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            return {"error": "Command must be JSON"}
+        if source_id is not None and isinstance(command, dict):
+            command.setdefault("source_id", source_id)
+        error = _command_error(command)
+        if error is not None:
+            return {"error": error}
+        _, result = await self._submit(command, wait_for_reply=False)
+        return result
+
+    async def _ws_send_loop(self, writer: asyncio.StreamWriter, stream: _Stream):
+        try:
+            while True:
+                item = await stream.queue.get()
+                if item is _KEEPALIVE:
+                    writer.write(encode_ws_frame(0x9, b""))
+                else:
+                    writer.write(encode_ws_frame(0x1, orjson.dumps(item)))
+                await writer.drain()
+        except ConnectionError:
+            writer.close()
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        self.bus.unsubscribe("agent_responses", self._on_response)
+
+
+def _apply_mask(payload: bytes, mask: bytes) -> bytes:
+    # XOR as one big integer instead of byte by byte.
+    size = len(payload)
+    key = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(payload) ^ int.from_bytes(key)).to_bytes(size)
+
+
+def encode_ws_frame(opcode: int, payload: bytes, mask: Optional[bytes] = None) -> bytes:
+    """Encodes a single final WebSocket frame; clients must pass a ``mask``."""
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if mask:
+        return header + mask + _apply_mask(payload, mask)
+    return header + payload
+
+
+async def read_ws_message(reader: asyncio.StreamReader, max_size: int) -> Tuple[int, bytes]:
+    """Reads one WebSocket message, joining fragments. Returns (opcode, payload)."""
+    opcode = None
+    chunks = []
+    size = 0
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await reader.readexactly(8))
+        size += length
+        if size > max_size:
+            raise ConnectionError("WebSocket message too large")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = _apply_mask(payload, mask)
+        frame_opcode = first & 0x0F
+        if frame_opcode >= 0x8:
+            # Control frames may arrive between the fragments of a message.
+            return frame_opcode, payload
+        if opcode is None:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if first & 0x80:
+            return opcode, b"".join(chunks)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class GroupCommit:
+    """
+    Schedules group commits for a writer that buffers work. Once woken it
+    waits ``interval`` seconds for more work to join, unless ``backlog()``
+    already reaches ``max_batch``, then calls ``flush()``; it keeps flushing
+    while a backlog remains. The task is started by the first ``wake()``.
+
+    ``abandon()``, if given, is called when the task ends early, e.g. on
+    cancellation, so that nobody waits on buffered work forever.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[], Awaitable[None]],
+        backlog: Callable[[], int],
+        interval: float,
+        max_batch: int,
+        abandon: Optional[Callable[[], None]] = None,
+    ):
+        self._flush = flush
+        self._backlog = backlog
+        self._interval = interval
+        self._max_batch = max_batch
+        self._abandon = abandon
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def wake(self):
+        """Schedules a flush, starting the task if it is not running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                # Give concurrent writers a moment to join this commit.
+                if not self._stopping and self._backlog() < self._max_batch:
+                    await asyncio.sleep(self._interval)
+                self._wakeup.clear()
+                await self._flush()
+                if self._backlog():
+                    self._wakeup.set()
+                elif self._stopping:
+                    return
+        except BaseException:
+            if self._abandon is not None:
+                self._abandon()
+            raise
+
+    async def stop(self):
+        """Flushes the backlog and waits for the task to end."""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await task
+        finally:
+            self._stopping = False
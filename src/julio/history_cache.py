@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, List, Optional
+
+
+@dataclass(slots=True)
+class _History:
+    # Parsed events, newest first.
+    events: List[dict] = field(default_factory=list)
+    # Encoded size of each event, parallel to ``events``.
+    sizes: List[int] = field(default_factory=list)
+    # True when ``events`` holds every stored event of the session.
+    complete: bool = False
+    nbytes: int = 0
+
+
+class HistoryCache:
+    """
+    Size-aware LRU of parsed recent events per session, bounded by both the
+    number of sessions and the encoded size of their events. At most
+    ``max_events`` events are kept per session.
+
+    Writers keep it current with ``append()`` instead of invalidating, so a
+    session that is being talked to is always served from memory. Returned
+    events are shared with the cache and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: Optional[int] = None,
+        max_events: int = 50,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_events = max_events
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, _History]" = OrderedDict()
+        # Bumped by every write, so a fill that raced one is not stored.
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, limit: int) -> Optional[List[dict]]:
+        """Returns the newest ``limit`` events if they are all cached."""
+        entry = self._entries.get(key)
+        if entry is None or (not entry.complete and len(entry.events) < limit):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.events[:limit]
+
+    def fill(
+        self,
+        key: Hashable,
+        events: List[dict],
+        sizes: List[int],
+        complete: bool,
+        generation: int,
+    ):
+        """
+        Stores events loaded from the database, newest first, unless a write
+        happened since ``generation`` was read.
+        """
+        if generation != self.generation or not self.max_entries:
+            return
+        self._store(key, _History(list(events), list(sizes), complete, sum(sizes)))
+
+    def record_write(self):
+        """
+        Notes a write to a session that is not cached, so that a load racing
+        it is not stored. Cheaper than ``append()`` for such sessions.
+        """
+        self.generation += 1
+
+    def append(self, key: Hashable, event: dict, size: int, timestamp: float):
+        """Adds a newly written event to a cached session."""
+        self.generation += 1
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if entry.events and entry.events[0].get("timestamp", 0) > timestamp:
+            # Out of order: cheaper to reload than to splice.
+            self.discard(key)
+            return
+        entry.events.insert(0, event)
+        entry.sizes.insert(0, size)
+        entry.nbytes += size
+        self.nbytes += size
+        while len(entry.events) > self.max_events:
+            self._drop_oldest(entry)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def reset(self, key: Hashable):
+        """Records that a session exists and has no events yet."""
+        self.generation += 1
+        if self.max_entries:
+            self._store(key, _History(complete=True))
+
+    def discard(self, key: Hashable):
+        self.generation += 1
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+    def _drop_oldest(self, entry: _History):
+        entry.events.pop()
+        size = entry.sizes.pop()
+        entry.nbytes -= size
+        self.nbytes -= size
+        entry.complete = False
+
+    def _store(self, key: Hashable, entry: _History):
+        while len(entry.events) > self.max_events:
+            entry.events.pop()
+            entry.nbytes -= entry.sizes.pop()
+            entry.complete = False
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._entries[key] = entry
+        self.nbytes += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
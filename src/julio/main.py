@@ -1,8 +1,20 @@
 import asyncio
+import math
+import random
 import signal
-from .config import load_config
-from .bus import MessageBus
+from typing import Optional
+from .config import AgentConfig, load_config
+from .admission import AdmissionController
+from .bus import MessageBus, Priority, RetryPolicy
+from .bus_log import CommandLog
+from .bus_metrics import MetricsServer
+from .bus_transport import BusServer
+from .gateway import Gateway
+from .dead_letters import InMemoryDeadLetterStore, PersistentDeadLetterStore
+from .event_codec import ZlibCodec
+from .history_cache import HistoryCache
 from .persistence import Persistence
+from .sessions import RunnerPool, SessionLocks
 from .skills_loader import SkillsLoader
 from .agent import AgentWrapper
 from .mcp_manager import MCPManager
@@ -10,23 +22,167 @@ from google.adk.runners import Runner
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
 
+HEARTBEAT_SOURCE_ID = "system_heartbeat"
 
-class AgentService:
-    def __init__(self, config_path: str = "agent.json"):
-        self.config = load_config(config_path)
-        self.persistence = Persistence(self.config.db_path)
-        self.bus = MessageBus(
-            max_tasks=self.config.bus_max_tasks,
-            max_queue_size=self.config.bus_max_queue_size,
+
+def coalesce_commands(commands: list) -> dict:
+    """Merges commands queued for one session into a single follow-up turn."""
+    if len({c.get("user_id") for c in commands}) > 1:
+        # Never run one user's message as another user's turn.
+        raise ValueError("Cannot coalesce commands of different users")
+    merged = {k: v for k, v in commands[-1].items() if k != "correlation_id"}
+    merged["content"] = "\n\n".join(
+        c.get("content", "") for c in commands if c.get("content")
+    )
+    correlation_ids = []
+    for command in commands:
+        correlation_ids.extend(command.get("correlation_ids", ()))
+        if "correlation_id" in command:
+            correlation_ids.append(command["correlation_id"])
+    if correlation_ids:
+        merged["correlation_ids"] = correlation_ids
+    # The turn is still useful while any of the callers is waiting.
+    deadlines = [c.get("deadline") for c in commands]
+    if None in deadlines:
+        merged.pop("deadline", None)
+    else:
+        merged["deadline"] = max(deadlines)
+    return merged
+
+
+def create_persistence(config: AgentConfig) -> Persistence:
+    """Opens the agent database described by ``config``."""
+    dict_codecs = []
+    for path in config.db_compression_dict_paths:
+        with open(path, "rb") as f:
+            dict_codecs.append(ZlibCodec(config.db_compression_level, zdict=f.read()))
+    codec = None
+    if config.db_compression == "zlib":
+        codec = dict_codecs[0] if dict_codecs else ZlibCodec(config.db_compression_level)
+    return Persistence(
+        config.db_path,
+        read_pool_size=config.db_read_pool_size,
+        cache_size_mb=config.db_cache_size_mb,
+        mmap_size_mb=config.db_mmap_size_mb,
+        write_batch_interval=(
+            None
+            if config.db_write_batch_interval_ms is None
+            else config.db_write_batch_interval_ms / 1000
+        ),
+        write_batch_max=config.db_write_batch_max,
+        history_cache=(
+            HistoryCache(
+                max_entries=config.history_cache_max_sessions,
+                max_bytes=config.history_cache_max_bytes,
+                max_events=config.history_cache_max_events,
+            )
+            if config.history_cache_max_sessions
+            else None
+        ),
+        codec=codec,
+        compress_min_bytes=config.db_compression_min_bytes,
+        decoders=dict_codecs,
+    )
+
+
+def create_bus(config: AgentConfig, persistence: Persistence, **kwargs) -> MessageBus:
+    """Builds the message bus described by ``config``; ``kwargs`` override options."""
+    command_log = None
+    if config.bus_wal_path:
+        command_log = CommandLog(
+            config.bus_wal_path,
+            flush_interval=config.bus_wal_flush_interval_ms / 1000,
+            max_batch=config.bus_wal_max_batch,
         )
+    if config.bus_dead_letter_store == "persistent":
+        dead_letters = PersistentDeadLetterStore(persistence)
+    else:
+        dead_letters = InMemoryDeadLetterStore(config.bus_dead_letter_max)
+    options = dict(
+        max_tasks=config.bus_max_tasks,
+        max_queue_size=config.bus_max_queue_size,
+        partition_key=config.bus_partition_key,
+        starvation_limit=config.bus_starvation_limit,
+        fair_key=config.bus_fair_key,
+        fair_weights=config.bus_fair_weights,
+        high_watermark=config.bus_high_watermark,
+        low_watermark=config.bus_low_watermark,
+        min_tasks=config.bus_min_tasks,
+        idle_timeout=config.bus_worker_idle_timeout_seconds,
+        scale_up_wait=config.bus_scale_up_wait_seconds,
+        command_log=command_log,
+        durable_channels=config.bus_durable_channels,
+        dead_letters=dead_letters,
+        schedule_store=persistence if config.bus_persist_schedules else None,
+        message_ttls=(
+            {"agent_commands": config.command_ttl_seconds}
+            if config.command_ttl_seconds
+            else None
+        ),
+        dead_letter_expired=config.command_dead_letter_expired,
+    )
+    options.update(kwargs)
+    return MessageBus(**options)
+
+
+def create_gateway(config: AgentConfig, bus: MessageBus) -> Optional[Gateway]:
+    """Builds the HTTP gateway if ``gateway_port`` is configured."""
+    if config.gateway_port is None:
+        return None
+    return Gateway(
+        bus,
+        config.gateway_host,
+        config.gateway_port,
+        client_buffer=config.gateway_client_buffer,
+        keepalive_interval=config.gateway_keepalive_seconds,
+        request_timeout=config.gateway_request_timeout_seconds,
+    )
+
+
+class AgentService:
+    def __init__(
+        self, config_path: str = "agent.json", config: Optional[AgentConfig] = None
+    ):
+        self.config = config if config is not None else load_config(config_path)
+        self.persistence = create_persistence(self.config)
+        self.bus = create_bus(self.config, self.persistence)
         self.skills_loader = SkillsLoader(self.config.skills_path)
         self.mcp_manager = MCPManager(
             self.config.mcp_servers,
             keep_alive_interval=self.config.mcp_keep_alive_interval_seconds,
         )
+        self.metrics_server = None
+        if self.config.metrics_port is not None:
+            self.metrics_server = MetricsServer(
+                self.bus, self.config.metrics_host, self.config.metrics_port
+            )
+        self.gateway = create_gateway(self.config, self.bus)
+        self.bus_server = None
+        if self.config.bus_socket_path:
+            self.bus_server = BusServer(self.bus, self.config.bus_socket_path)
         self.agent_wrapper = None
         self.runner = None
+        # Set when runner_pool_size > 1; otherwise every turn shares self.runner.
+        self.runner_pool: Optional[RunnerPool] = None
+        # Shared by every runner so a session sees the same memory and
+        # artifacts whichever runner picks up its turn.
+        self.memory_service = InMemoryMemoryService()
+        self.artifact_service = InMemoryArtifactService()
+        self.session_locks = SessionLocks()
+        per_minute = self.config.user_rate_limits_per_minute
+        self.admission = AdmissionController(
+            max_in_flight=self.config.max_concurrent_turns,
+            user_rate=(
+                self.config.user_rate_limit_per_minute / 60
+                if self.config.user_rate_limit_per_minute
+                else None
+            ),
+            user_burst=self.config.user_rate_burst,
+            user_rates={user: rate / 60 for user, rate in per_minute.items()},
+        )
         self.stop_event = asyncio.Event()
+        # Set once commands are being handled.
+        self.ready = asyncio.Event()
 
     async def start(self):
         print("Starting ADK Agent Service...")
@@ -39,31 +195,73 @@ class AgentService:
         # 2. Start MCP Manager and Message Bus
         await self.mcp_manager.start()
         await self.bus.start()
+        if self.metrics_server:
+            await self.metrics_server.start()
 
         # 3. Create AgentWrapper
         self.agent_wrapper = await AgentWrapper.create(
             self.config, self.skills_loader, self.mcp_manager, self.persistence
         )
 
-        # 4. Create ADK Runner
-        self.runner = Runner(
-            app_name="agent_service_app",
-            agent=self.agent_wrapper.agent,
-            session_service=self.persistence.session_service,
-            memory_service=InMemoryMemoryService(),
-            artifact_service=InMemoryArtifactService(),
-        )
+        # 4. Create ADK Runner, plus extra agents and runners for a pool
+        self.runner = self._create_runner(self.agent_wrapper.agent)
+        if self.config.runner_pool_size > 1:
+            runners = [self.runner]
+            for _ in range(self.config.runner_pool_size - 1):
+                wrapper = await AgentWrapper.create(
+                    self.config, self.skills_loader, self.mcp_manager, self.persistence
+                )
+                runners.append(self._create_runner(wrapper.agent))
+            self.runner_pool = RunnerPool(runners)
 
         # 5. Subscribe to commands
-        await self.bus.subscribe_to_commands("agent_commands", self._handle_command)
+        await self.bus.subscribe_to_commands(
+            "agent_commands",
+            self._handle_command,
+            timeout=self.config.command_handler_timeout_seconds,
+            retry=RetryPolicy(
+                max_attempts=self.config.command_retry_max_attempts,
+                base_delay=self.config.command_retry_base_delay_seconds,
+                max_delay=self.config.command_retry_max_delay_seconds,
+            ),
+            coalesce=coalesce_commands if self.config.coalesce_commands else None,
+            # A session is (user_id, source_id); lanes only key on source_id.
+            coalesce_key="user_id",
+        )
+        # Re-deliver commands left unacked by a crash or redeploy
+        await self.bus.replay_pending()
+        # Let other local processes publish and subscribe once commands are handled
+        if self.bus_server:
+            await self.bus_server.start()
+        if self.gateway:
+            await self.gateway.start()
 
         # 6. Start heartbeat loop
-        asyncio.create_task(self.heartbeat_loop())
+        if self.config.heartbeat_enabled:
+            asyncio.create_task(self.heartbeat_loop())
+        self.ready.set()
 
         # 7. Wait on stop_event
         print("Agent Service is running. Listening on 'agent_commands' channel.")
         await self.stop_event.wait()
 
+    def _create_runner(self, agent) -> Runner:
+        return Runner(
+            app_name="agent_service_app",
+            agent=agent,
+            session_service=self.persistence.session_service,
+            memory_service=self.memory_service,
+            artifact_service=self.artifact_service,
+        )
+
+    async def _run_turn(self, **kwargs) -> dict:
+        # One turn per session at a time, or ADK sees interleaved events.
+        async with self.session_locks.hold((kwargs["user_id"], kwargs["source_id"])):
+            if self.runner_pool is None:
+                return await self.agent_wrapper.process_command(self.runner, **kwargs)
+            async with self.runner_pool.checkout() as runner:
+                return await self.agent_wrapper.process_command(runner, **kwargs)
+
     async def _handle_command(self, data: dict):
         source_id = data.get("source_id", "default")
         user_id = data.get("user_id", "default")
@@ -75,39 +273,145 @@ class AgentService:
             print("Error: Agent not initialized")
             return
 
-        response = await self.agent_wrapper.process_command(
-            self.runner, source_id=source_id, user_id=user_id, content=content
+        # Replies keep heartbeat output out of the way of users, and carry the
+        # correlation ids so the bus routes them straight to request() callers
+        priority = (
+            Priority.BACKGROUND
+            if source_id == HEARTBEAT_SOURCE_ID
+            else Priority.INTERACTIVE
         )
+        reply_ids = {
+            key: data[key] for key in ("correlation_id", "correlation_ids") if key in data
+        }
 
-        # Publish response
-        await self.bus.publish_response("agent_responses", response)
+        # Refuse right away when over capacity or over the user's rate
+        rejection = self.admission.try_admit(user_id)
+        if rejection is not None:
+            reason, retry_after = rejection
+            message = (
+                "The agent is busy, please try again shortly."
+                if reason == "overloaded"
+                else "Too many requests, please slow down."
+            )
+            await self.bus.publish_response(
+                "agent_responses",
+                {
+                    "source_id": source_id,
+                    "user_id": user_id,
+                    "content": message,
+                    "needs_input": False,
+                    "error": reason,
+                    "retry_after": round(retry_after, 3),
+                    **reply_ids,
+                },
+                priority,
+            )
+            print(f"Rejected command from {source_id}/{user_id}: {reason}")
+            return
+
+        on_chunk = None
+        if self.config.stream_responses:
+            seq = 0
+
+            async def on_chunk(text: str):
+                nonlocal seq
+                chunk = {
+                    "source_id": source_id,
+                    "user_id": user_id,
+                    "content": text,
+                    "partial": True,
+                    "seq": seq,
+                    **reply_ids,
+                }
+                seq += 1
+                await self.bus.publish_response("agent_responses", chunk, priority)
+
+        try:
+            response = await self._run_turn(
+                source_id=source_id,
+                user_id=user_id,
+                content=content,
+                on_chunk=on_chunk,
+            )
+        finally:
+            self.admission.release()
+        if on_chunk is not None:
+            response["partial"] = False
+        response.update(reply_ids)
+
+        await self.bus.publish_response("agent_responses", response, priority)
         print("Sent response to agent_responses")
 
     async def heartbeat_loop(self):
         interval = self.config.heartbeat_interval_minutes * 60
+        loop = asyncio.get_running_loop()
+        # Ticks are laid out on a fixed grid from startup, so slow turns do not
+        # push later heartbeats back; jitter keeps replicas out of lockstep.
+        next_tick = loop.time() + interval
+        heartbeat = None
         while not self.stop_event.is_set():
+            jitter = random.uniform(-1, 1) * self.config.heartbeat_jitter * interval
+            delay = max(0.0, next_tick + jitter - loop.time())
             try:
-                await asyncio.wait_for(self.stop_event.wait(), timeout=interval)
+                await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
             except asyncio.TimeoutError:
-                # Timeout means heartbeat should trigger
-                if self.stop_event.is_set():
-                    break
-                print("Heartbeat trigger")
-            else:
-                # stop_event was set
+                pass
+            if self.stop_event.is_set():
                 break
-            heartbeat_data = {
-                "source_id": "system_heartbeat",
-                "user_id": "system",
-                "content": "Heartbeat trigger: Check for any pending tasks or status updates.",
-            }
-            await self._handle_command(heartbeat_data)
+            # Skip ticks we slept through instead of firing them back to back.
+            now = loop.time()
+            next_tick += interval * max(1, math.ceil((now - next_tick) / interval))
+
+            if heartbeat is not None and not heartbeat.done():
+                print("Heartbeat skipped: previous heartbeat still running")
+                continue
+            busy = self.bus.in_flight("agent_commands")
+            if (
+                self.bus.depth >= self.config.heartbeat_max_queue_depth
+                or busy >= self.config.heartbeat_max_in_flight
+            ):
+                print(
+                    f"Heartbeat skipped: bus depth {self.bus.depth}, "
+                    f"{busy} commands in flight"
+                )
+                continue
+            print("Heartbeat trigger")
+            heartbeat = asyncio.create_task(self._send_heartbeat(interval))
+        if heartbeat is not None:
+            heartbeat.cancel()
+
+    async def _send_heartbeat(self, timeout: float):
+        heartbeat_data = {
+            "source_id": HEARTBEAT_SOURCE_ID,
+            "user_id": "system",
+            "content": "Heartbeat trigger: Check for any pending tasks or status updates.",
+        }
+        # Go through the bus so heartbeat turns queue behind user commands. The
+        # request expires after one interval, so a stuck heartbeat cannot block
+        # the next one for longer than that.
+        try:
+            await self.bus.request(
+                "agent_commands",
+                heartbeat_data,
+                timeout=timeout,
+                priority=Priority.BACKGROUND,
+            )
+        except (TimeoutError, asyncio.QueueFull) as e:
+            print(f"Heartbeat did not complete: {e!r}")
 
     async def stop(self):
         print("Stopping Agent Service...")
         self.stop_event.set()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.gateway:
+            await self.gateway.stop()
+        if self.bus_server:
+            await self.bus_server.stop()
         await self.bus.stop()
-        if self.runner:
+        if self.runner_pool:
+            await self.runner_pool.close()
+        elif self.runner:
             await self.runner.close()
         await self.mcp_manager.stop()
         await self.persistence.close()
@@ -4,12 +4,203 @@ from google.adk.sessions.sqlite_session_service import (
 )
 import aiosqlite
 import asyncio
+import contextvars
+import logging
+import os
 import orjson
 from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .event_codec import (
+    EventCodec,
+    ZlibCodec,
+    decode,
+    decoding_row_factory,
+    encode,
+    train_zdict,
+)
+from .group_commit import GroupCommit
+from .history_cache import HistoryCache
+
+logger = logging.getLogger(__name__)
+
+CREATE_DEAD_LETTERS_SQL = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    message BLOB NOT NULL,
+    priority INTEGER NOT NULL,
+    error TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+CREATE_SCHEDULED_MESSAGES_SQL = """
+CREATE TABLE IF NOT EXISTS scheduled_messages (
+    id TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    message BLOB NOT NULL,
+    priority INTEGER NOT NULL,
+    due_at REAL NOT NULL,
+    interval REAL,
+    cron TEXT
+);
+"""
+
+BUSY_TIMEOUT_MS = 5000
+# Events at least this large are compressed on a worker thread.
+LARGE_EVENT_BYTES = 64 * 1024
+
+# Set while an ADK read (get_session/list_sessions) runs, so its connection
+# comes from the read-only pool instead of the writer.
+_read_only: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "julio_persistence_read_only", default=False
+)
+# Set while a session write runs inside a WriteBatcher transaction.
+_batch_db: contextvars.ContextVar[Optional[aiosqlite.Connection]] = contextvars.ContextVar(
+    "julio_persistence_batch_db", default=None
+)
+
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class _SessionWriter:
+    """
+    Writer connection as seen by ADK session writes: event_data inserted by
+    ``append_event`` is encoded with the Persistence codec, and in a batched
+    write the commit is left to the batch.
+    """
+
+    def __init__(self, db: aiosqlite.Connection, persistence: "Persistence", batched: bool):
+        self._db = db
+        self._persistence = persistence
+        self._batched = batched
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def execute(self, sql: str, parameters=None):
+        if self._persistence.codec is not None and sql.lstrip().startswith(
+            "INSERT INTO events"
+        ):
+            return self._insert_event(sql, parameters)
+        return self._db.execute(sql, parameters)
+
+    async def _insert_event(self, sql: str, parameters):
+        # ADK passes event_data as the last column.
+        data = await self._persistence.encode_event_data(parameters[-1])
+        return await self._db.execute(sql, (*parameters[:-1], data))
+
+    async def commit(self):
+        if not self._batched:
+            await self._db.commit()
+
+
+class WriteBatcher:
+    """
+    Group-commits writes on the Persistence writer connection.
+
+    Submitted operations from concurrent callers share one transaction,
+    committed every ``flush_interval`` seconds or as soon as ``max_batch``
+    operations are waiting. Each runs in its own SAVEPOINT, so a failing one
+    is rolled back alone, and ``submit()`` only returns once its operation is
+    committed.
+    """
+
+    def __init__(
+        self, persistence: "Persistence", flush_interval: float = 0.002, max_batch: int = 256
+    ):
+        self.persistence = persistence
+        self._max_batch = max_batch
+        self._pending: List[Tuple[WriteOp, asyncio.Future]] = []
+        self._commits = GroupCommit(
+            self._flush_next,
+            lambda: len(self._pending),
+            flush_interval,
+            max_batch,
+            abandon=self._cancel_pending,
+        )
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Runs ``op(db)`` in the next batch and returns its result once committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        self._commits.wake()
+        return await future
+
+    async def _flush_next(self):
+        batch = self._pending[: self._max_batch]
+        del self._pending[: self._max_batch]
+        await self._flush(batch)
+
+    def _cancel_pending(self):
+        pending, self._pending = self._pending, []
+        for _, future in pending:
+            future.cancel()
+
+    async def _flush(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        if not batch:
+            return
+        outcomes = []
+        try:
+            # write_connection() rolls back if anything below raises.
+            async with self.persistence.write_connection() as db:
+                await db.execute("BEGIN")
+                for op, future in batch:
+                    if future.cancelled():
+                        continue
+                    await db.execute("SAVEPOINT batched_write")
+                    try:
+                        outcomes.append((future, None, await op(db)))
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO batched_write")
+                        outcomes.append((future, e, None))
+                    await db.execute("RELEASE batched_write")
+                await db.commit()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                logger.error(f"Failed to commit write batch: {e!r}")
+            for _, future in batch:
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+        for future, error, result in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        """Commits outstanding writes and stops the flush task."""
+        await self._commits.stop()
 
 
 class OptimizedSqliteSessionService(SqliteSessionService):
-    """Subclass of SqliteSessionService that uses a shared connection to avoid overhead."""
+    """
+    SqliteSessionService on the Persistence connections: session reads use the
+    read-only pool, and session and event writes are group-committed by the
+    Persistence WriteBatcher (or use the writer directly without one).
+    """
 
     def __init__(self, persistence: "Persistence"):
         super().__init__(db_path=persistence.db_path)
@@ -17,21 +208,142 @@ class OptimizedSqliteSessionService(SqliteSessionService):
 
     @asynccontextmanager
     async def _get_db_connection(self):
-        db = await self.persistence.get_connection()
-        yield db
+        batch_db = _batch_db.get()
+        if batch_db is not None:
+            yield _SessionWriter(batch_db, self.persistence, batched=True)
+        elif _read_only.get():
+            async with self.persistence.read_connection() as db:
+                yield db
+        else:
+            async with self.persistence.write_connection() as db:
+                yield _SessionWriter(db, self.persistence, batched=False)
+
+    async def get_session(self, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return await super().get_session(**kwargs)
+        finally:
+            _read_only.reset(token)
+
+    async def list_sessions(self, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return await super().list_sessions(**kwargs)
+        finally:
+            _read_only.reset(token)
+
+    async def _batched(self, write: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        batcher = self.persistence.batcher
+        if batcher is None:
+            return await write(**kwargs)
+
+        async def op(db: aiosqlite.Connection):
+            token = _batch_db.set(db)
+            try:
+                return await write(**kwargs)
+            finally:
+                _batch_db.reset(token)
+
+        return await batcher.submit(op)
+
+    async def create_session(self, **kwargs):
+        session = await self._batched(super().create_session, **kwargs)
+        cache = self.persistence.history_cache
+        if cache is not None:
+            cache.reset((session.id, session.user_id))
+        return session
+
+    async def delete_session(self, **kwargs):
+        await self._batched(super().delete_session, **kwargs)
+        cache = self.persistence.history_cache
+        if cache is not None:
+            cache.discard((kwargs["session_id"], kwargs["user_id"]))
+
+    async def append_event(self, session, event):
+        if event.partial:
+            return event
+        event = await self._batched(super().append_event, session=session, event=event)
+        cache = self.persistence.history_cache
+        key = (session.id, session.user_id)
+        if cache is not None and key in cache:
+            # Only sessions being read pay for encoding the event again.
+            data = event.model_dump_json(exclude_none=True)
+            cache.append(key, orjson.loads(data), len(data), event.timestamp)
+        elif cache is not None:
+            cache.record_write()
+        return event
 
 
 class Persistence:
-    """Manager for SQLite connection and ADK Session Service."""
+    """
+    Manager for SQLite connections and the ADK Session Service.
+
+    The database runs in WAL mode with one writer connection, whose
+    transactions are serialized, and up to ``read_pool_size`` read-only
+    connections for history and session reads, so readers neither wait for
+    the writer nor for each other. Session writes are group-committed every
+    ``write_batch_interval`` seconds; None commits each one on its own.
+    With a ``history_cache``, ``get_history`` of active sessions is served
+    from memory.
 
-    def __init__(self, db_path: str):
+    With a ``codec``, event_data of new events is compressed when that saves
+    space (see ``julio.event_codec``) and decoded transparently on read;
+    ``migrate_event_data()`` re-encodes existing rows. Values written by
+    earlier codecs stay readable as long as they are listed in ``decoders``.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        read_pool_size: int = 4,
+        cache_size_mb: int = 16,
+        mmap_size_mb: int = 256,
+        write_batch_interval: Optional[float] = 0.002,
+        write_batch_max: int = 256,
+        history_cache: Optional[HistoryCache] = None,
+        codec: Optional[EventCodec] = None,
+        compress_min_bytes: int = 256,
+        decoders: Iterable[EventCodec] = (),
+    ):
         self.db_path = db_path
+        # In-memory databases are private to their connection: no readers.
+        self.read_pool_size = 0 if db_path == ":memory:" else read_pool_size
+        self._pragmas = (
+            f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+            f"PRAGMA cache_size = {-cache_size_mb * 1024}",
+            f"PRAGMA mmap_size = {mmap_size_mb * 1024 * 1024}",
+        )
         self._db: aiosqlite.Connection | None = None
         self._lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_slots = 0
+        self._idle_readers: asyncio.Queue = asyncio.Queue()
+        self.batcher: Optional[WriteBatcher] = None
+        if write_batch_interval is not None:
+            self.batcher = WriteBatcher(self, write_batch_interval, write_batch_max)
+        self.history_cache = history_cache
+        self.codec = codec
+        self.compress_min_bytes = compress_min_bytes
+        self._codecs: Dict[int, EventCodec] = {1: ZlibCodec()}
+        for known in (*decoders, *([codec] if codec else [])):
+            existing = self._codecs.get(known.codec_id)
+            if existing is not None and existing != known:
+                # Rows written with one of them would become unreadable.
+                raise ValueError(f"Event codecs share id {known.codec_id:#x}")
+            self._codecs[known.codec_id] = known
         self.session_service = OptimizedSqliteSessionService(self)
 
+    async def _configure(self, db: aiosqlite.Connection):
+        db.row_factory = decoding_row_factory(self._codecs)
+        for pragma in self._pragmas:
+            await db.execute(pragma)
+
     async def get_connection(self) -> aiosqlite.Connection:
-        """Returns a thread-safe shared connection, initializing schema on first connect."""
+        """
+        Returns the writer connection, initializing schema on first connect.
+        Writes should go through ``write_connection()``.
+        """
         if self._db is not None:
             return self._db
 
@@ -39,7 +351,13 @@ class Persistence:
             if self._db is None:
                 db = await aiosqlite.connect(self.db_path)
                 try:
+                    await self._configure(db)
+                    await db.execute("PRAGMA journal_mode = WAL")
+                    await db.execute("PRAGMA synchronous = NORMAL")
+                    await db.execute("PRAGMA foreign_keys = ON")
                     await db.executescript(CREATE_SCHEMA_SQL)
+                    await db.executescript(CREATE_DEAD_LETTERS_SQL)
+                    await db.executescript(CREATE_SCHEDULED_MESSAGES_SQL)
                     # Create index for optimized history retrieval
                     await db.execute(
                         "CREATE INDEX IF NOT EXISTS idx_events_session_user_timestamp "
@@ -52,29 +370,327 @@ class Persistence:
                     raise
             return self._db
 
+    @asynccontextmanager
+    async def write_connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Holds the writer for one transaction; it is rolled back if the block
+        raises, so a failed write never leaks into the next one's commit.
+        """
+        db = await self.get_connection()
+        async with self._write_lock:
+            try:
+                yield db
+            except BaseException:
+                if db.in_transaction:
+                    await db.rollback()
+                raise
+
+    async def _open_reader(self) -> aiosqlite.Connection:
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        db = await aiosqlite.connect(uri, uri=True)
+        try:
+            await self._configure(db)
+            await db.execute("PRAGMA query_only = ON")
+        except Exception:
+            await db.close()
+            raise
+        return db
+
+    @asynccontextmanager
+    async def read_connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Checks out a read-only connection, opening one while the pool is
+        below ``read_pool_size`` and otherwise waiting for a free one.
+        """
+        writer = await self.get_connection()
+        if not self.read_pool_size:
+            yield writer
+            return
+        if self._idle_readers.empty() and self._reader_slots < self.read_pool_size:
+            # Claim the slot before awaiting so concurrent callers respect the bound.
+            self._reader_slots += 1
+            try:
+                db = await self._open_reader()
+            except Exception:
+                self._reader_slots -= 1
+                raise
+            self._readers.append(db)
+        else:
+            db = await self._idle_readers.get()
+        try:
+            yield db
+        finally:
+            self._idle_readers.put_nowait(db)
+
     async def get_history(self, session_id: str, user_id: str, limit: int = 10):
         """Retrieves recent conversation history from the events table."""
-        db = await self.get_connection()
+        key = (session_id, user_id)
+        cache = self.history_cache
+        if cache is not None:
+            cached = cache.get(key, limit)
+            if cached is not None:
+                return cached
+            generation = cache.generation
         query = (
             "SELECT event_data FROM events "
             "WHERE session_id = ? AND user_id = ? "
             "ORDER BY timestamp DESC LIMIT ?"
         )
-        async with db.execute(query, (session_id, user_id, limit)) as cursor:
-            rows = await cursor.fetchall()
-            # ADK stores event_data as JSON.
+        async with self.read_connection() as db:
+            async with db.execute(query, (session_id, user_id, limit)) as cursor:
+                rows = await cursor.fetchall()
+        # ADK stores event_data as JSON.
+        if not rows:
+            if cache is not None:
+                cache.fill(key, [], [], True, generation)
+            return []
+
+        def _parse_rows(rows_to_parse):
+            return [orjson.loads(row[0]) for row in rows_to_parse if row[0]]
+
+        # Offload JSON parsing to a thread to avoid blocking the event loop
+        events = await asyncio.to_thread(_parse_rows, rows)
+        if cache is not None:
+            sizes = [len(row[0]) for row in rows if row[0]]
+            cache.fill(key, events, sizes, len(rows) < limit, generation)
+        return events
+
+    async def iter_history(
+        self,
+        session_id: str,
+        user_id: str,
+        newest_first: bool = True,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[dict]:
+        """
+        Yields every event of a session, newest or oldest first, in constant
+        memory. Rows are fetched ``chunk_size`` at a time by keyset pagination
+        on (timestamp, id), and a reader is only held while fetching a chunk.
+        """
+        if newest_first:
+            order, before = "DESC", "<"
+        else:
+            order, before = "ASC", ">"
+        first_query = (
+            "SELECT timestamp, id, event_data FROM events "
+            "WHERE session_id = ? AND user_id = ? "
+            f"ORDER BY timestamp {order}, id {order} LIMIT ?"
+        )
+        next_query = (
+            "SELECT timestamp, id, event_data FROM events "
+            "WHERE session_id = ? AND user_id = ? "
+            f"AND timestamp {before}= ? AND (timestamp {before} ? OR id {before} ?) "
+            f"ORDER BY timestamp {order}, id {order} LIMIT ?"
+        )
+
+        def _parse_rows(rows_to_parse):
+            return [orjson.loads(row[2]) for row in rows_to_parse if row[2]]
+
+        params: tuple = (session_id, user_id, chunk_size)
+        query = first_query
+        while True:
+            async with self.read_connection() as db:
+                async with db.execute(query, params) as cursor:
+                    rows = await cursor.fetchall()
             if not rows:
-                return []
+                return
+            for event in await asyncio.to_thread(_parse_rows, rows):
+                yield event
+            if len(rows) < chunk_size:
+                return
+            timestamp, event_id = rows[-1][0], rows[-1][1]
+            query = next_query
+            params = (session_id, user_id, timestamp, timestamp, event_id, chunk_size)
 
-            def _parse_rows(rows_to_parse):
-                return [orjson.loads(row[0]) for row in rows_to_parse if row[0]]
+    async def encode_event_data(self, data: Union[str, bytes]) -> Union[str, bytes]:
+        """Encodes event_data for storage with the configured codec."""
+        if self.codec is None or len(data) < self.compress_min_bytes:
+            return data
+        if len(data) >= LARGE_EVENT_BYTES:
+            # Keep big tool outputs from stalling the event loop.
+            return await asyncio.to_thread(encode, data, self.codec, self.compress_min_bytes)
+        return encode(data, self.codec, self.compress_min_bytes)
 
-            # Offload JSON parsing to a thread to avoid blocking the event loop
-            return await asyncio.to_thread(_parse_rows, rows)
+    async def train_compression_dict(self, samples: int = 2000, size: int = 32 * 1024) -> bytes:
+        """Builds a zlib preset dictionary from the most recent stored events."""
+        async with self.read_connection() as db:
+            async with db.execute(
+                "SELECT event_data FROM events ORDER BY timestamp DESC LIMIT ?", (samples,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return await asyncio.to_thread(train_zdict, [row[0] for row in rows if row[0]], size)
+
+    async def migrate_event_data(self, batch_size: int = 500) -> int:
+        """
+        Re-encodes stored event_data with the current codec, or back to plain
+        JSON without one, a batch per transaction so it can run while the
+        service is live. Returns the number of rows rewritten.
+        """
+        rewritten = 0
+        last_rowid = 0
+        while True:
+            async with self.write_connection() as db:
+                async with db.cursor() as cursor:
+                    # Bypass decoding: raw values tell which rows need work.
+                    # Only on this cursor, as others may share the connection.
+                    cursor.row_factory = None
+                    await cursor.execute(
+                        "SELECT rowid, event_data FROM events WHERE rowid > ? "
+                        "ORDER BY rowid LIMIT ?",
+                        (last_rowid, batch_size),
+                    )
+                    rows = await cursor.fetchall()
+                if not rows:
+                    return rewritten
+                last_rowid = rows[-1][0]
+
+                def _reencode(rows_to_encode):
+                    updates = []
+                    for rowid, stored in rows_to_encode:
+                        value = decode(stored, self._codecs)
+                        if self.codec is None:
+                            target = value.decode() if isinstance(value, bytes) else value
+                        else:
+                            target = encode(value, self.codec, self.compress_min_bytes)
+                        if target != stored:
+                            updates.append((target, rowid))
+                    return updates
+
+                updates = await asyncio.to_thread(_reencode, rows)
+                if updates:
+                    await db.executemany(
+                        "UPDATE events SET event_data = ? WHERE rowid = ?", updates
+                    )
+                    await db.commit()
+                    rewritten += len(updates)
+
+    async def add_dead_letter(self, letter: dict) -> int:
+        """Stores a message that exhausted its bus retries. Returns its id."""
+        async with self.write_connection() as db:
+            cursor = await db.execute(
+                "INSERT INTO dead_letters (channel, message, priority, error, attempts, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    letter["channel"],
+                    orjson.dumps(letter["message"]),
+                    letter["priority"],
+                    letter["error"],
+                    letter["attempts"],
+                    letter["failed_at"],
+                ),
+            )
+            await db.commit()
+        return cursor.lastrowid
+
+    async def list_dead_letters(
+        self, channel: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[dict]:
+        """Returns stored dead letters oldest first, optionally for one channel."""
+        query = (
+            "SELECT id, channel, message, priority, error, attempts, failed_at "
+            "FROM dead_letters"
+        )
+        params: list = []
+        if channel is not None:
+            query += " WHERE channel = ?"
+            params.append(channel)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        async with self.read_connection() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+
+        def _parse_rows(rows_to_parse):
+            return [
+                {
+                    "id": row[0],
+                    "channel": row[1],
+                    "message": orjson.loads(row[2]),
+                    "priority": row[3],
+                    "error": row[4],
+                    "attempts": row[5],
+                    "failed_at": row[6],
+                }
+                for row in rows_to_parse
+            ]
+
+        return await asyncio.to_thread(_parse_rows, rows)
+
+    async def delete_dead_letters(self, ids: Iterable[int]):
+        """Removes dead letters, e.g. after they were replayed."""
+        async with self.write_connection() as db:
+            await db.executemany(
+                "DELETE FROM dead_letters WHERE id = ?", [(i,) for i in ids]
+            )
+            await db.commit()
+
+    async def save_scheduled_message(self, timer: dict):
+        """Inserts or updates a pending bus timer."""
+        async with self.write_connection() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO scheduled_messages "
+                "(id, channel, message, priority, due_at, interval, cron) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    timer["id"],
+                    timer["channel"],
+                    orjson.dumps(timer["message"]),
+                    timer["priority"],
+                    timer["due_at"],
+                    timer["interval"],
+                    timer["cron"],
+                ),
+            )
+            await db.commit()
+
+    async def list_scheduled_messages(self) -> List[dict]:
+        """Returns all pending bus timers, earliest first."""
+        async with self.read_connection() as db:
+            async with db.execute(
+                "SELECT id, channel, message, priority, due_at, interval, cron "
+                "FROM scheduled_messages ORDER BY due_at"
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+        def _parse_rows(rows_to_parse):
+            return [
+                {
+                    "id": row[0],
+                    "channel": row[1],
+                    "message": orjson.loads(row[2]),
+                    "priority": row[3],
+                    "due_at": row[4],
+                    "interval": row[5],
+                    "cron": row[6],
+                }
+                for row in rows_to_parse
+            ]
+
+        return await asyncio.to_thread(_parse_rows, rows)
+
+    async def delete_scheduled_message(self, timer_id: str):
+        """Removes a fired or cancelled bus timer."""
+        async with self.write_connection() as db:
+            await db.execute("DELETE FROM scheduled_messages WHERE id = ?", (timer_id,))
+            await db.commit()
 
     async def close(self):
-        """Closes the shared database connection."""
+        """Commits batched writes, then closes the read pool and the writer."""
+        try:
+            if self.batcher is not None:
+                await self.batcher.close()
+        finally:
+            await self._close_connections()
+
+    async def _close_connections(self):
         async with self._lock:
+            for reader in self._readers:
+                await reader.close()
+            self._readers.clear()
+            self._reader_slots = 0
+            self._idle_readers = asyncio.Queue()
             if self._db:
                 await self._db.close()
                 self._db = None
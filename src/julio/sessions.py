@@ -0,0 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Hashable, List
+
+
+@dataclass(slots=True)
+class _SessionLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Turns holding or waiting for the lock.
+    users: int = 0
+
+
+class SessionLocks:
+    """
+    Per-session mutual exclusion for agent turns.
+
+    A lock only exists while a turn for its session is running or waiting,
+    and is evicted as soon as the last one finishes, so memory is bounded by
+    the number of sessions with work in flight rather than sessions ever seen.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, _SessionLock] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _SessionLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._locks[key]
+
+
+class RunnerPool:
+    """
+    Runners that agent turns check out one at a time, so turns of different
+    sessions run on separate Runner/LlmAgent instances.
+    """
+
+    def __init__(self, runners: List[Any]):
+        self.runners = list(runners)
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for runner in self.runners:
+            self._idle.put_nowait(runner)
+
+    def __len__(self) -> int:
+        return len(self.runners)
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[Any]:
+        runner = await self._idle.get()
+        try:
+            yield runner
+        finally:
+            self._idle.put_nowait(runner)
+
+    async def close(self):
+        for runner in self.runners:
+            await runner.close()
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from typing import Callable, Dict, Optional, Set
+
+from .bus import Priority, RetryPolicy
+from .bus_transport import BusServer, RemoteBus
+from .config import AgentConfig, load_config
+from .main import (
+    HEARTBEAT_SOURCE_ID,
+    AgentService,
+    create_bus,
+    create_gateway,
+    create_persistence,
+)
+
+logger = logging.getLogger(__name__)
+
+WORKER_GROUP = "agent_workers"
+
+
+def _worker_config(config: AgentConfig, index: int) -> AgentConfig:
+    # The supervisor owns the command log, metrics and socket; workers only
+    # run agent turns. One heartbeat is enough for the whole fleet.
+    return config.model_copy(
+        update={
+            "bus_wal_path": None,
+            "metrics_port": None,
+            "gateway_port": None,
+            "bus_socket_path": None,
+            "bus_persist_schedules": False,
+            "heartbeat_enabled": config.heartbeat_enabled and index == 0,
+        }
+    )
+
+
+async def _run_worker(config_path: str, index: int, socket_path: str):
+    config = _worker_config(load_config(config_path), index)
+    service = AgentService(config=config)
+    remote = RemoteBus(socket_path)
+
+    async def forward_response(message: dict):
+        priority = (
+            Priority.BACKGROUND
+            if message.get("source_id") == HEARTBEAT_SOURCE_ID
+            else Priority.INTERACTIVE
+        )
+        await remote.publish_response("agent_responses", message, priority, wait=True)
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, service.stop_event.set)
+    service_task = asyncio.create_task(service.start())
+    try:
+        await service.ready.wait()
+        await remote.start()
+        await service.bus.subscribe_to_commands("agent_responses", forward_response)
+        # Take our shard of the sessions; _handle_command publishes replies on
+        # the local bus, from where forward_response sends them back.
+        await remote.subscribe_to_commands(
+            "agent_commands",
+            service._handle_command,
+            group=WORKER_GROUP,
+            member=f"worker-{index}",
+            route_key=config.bus_partition_key or "source_id",
+            timeout=config.command_handler_timeout_seconds,
+        )
+        await service.stop_event.wait()
+    finally:
+        await remote.stop()
+        await service.stop()
+        await service_task
+
+
+def _worker_main(config_path: str, index: int, socket_path: str):
+    # Ctrl+C reaches the whole process group; let the supervisor shut us down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(config_path, index, socket_path))
+
+
+class Supervisor:
+    """
+    Runs AgentService across several processes.
+
+    The supervisor owns the message bus and serves it on a Unix socket. Each
+    worker process runs an AgentService that consumes ``agent_commands``
+    through a RemoteBus consumer group, sharded by consistent hash of
+    ``source_id`` so a session's turns always run in the same process.
+    Crashed workers are restarted under the same name and reclaim their
+    shard; when the worker count changes only the sessions of added or
+    removed workers move. In-flight commands of a lost worker are retried by
+    the bus on the worker that now owns their session.
+
+    ``worker_target(config_path, index, socket_path)`` is the function run in
+    each worker process.
+    """
+
+    def __init__(
+        self,
+        config_path: str = "agent.json",
+        workers: Optional[int] = None,
+        restart_delay: float = 1.0,
+        worker_target: Callable[[str, int, str], None] = _worker_main,
+    ):
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.workers = workers or self.config.supervisor_workers or os.cpu_count() or 1
+        self.socket_path = self.config.bus_socket_path or os.path.join(
+            tempfile.gettempdir(), f"julio-bus-{os.getpid()}.sock"
+        )
+        self.persistence = create_persistence(self.config)
+        self.bus = create_bus(
+            self.config,
+            self.persistence,
+            retry_policy=RetryPolicy(
+                max_attempts=self.config.command_retry_max_attempts,
+                base_delay=self.config.command_retry_base_delay_seconds,
+                max_delay=self.config.command_retry_max_delay_seconds,
+            ),
+        )
+        self.bus_server = BusServer(self.bus, self.socket_path)
+        self.gateway = create_gateway(self.config, self.bus)
+        self._restart_delay = restart_delay
+        self._worker_target = worker_target
+        self._tasks: Set[asyncio.Task] = set()
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self.stop_event = asyncio.Event()
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=self._worker_target,
+            args=(self.config_path, index, self.socket_path),
+            name=f"julio-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    async def _terminate(self, index: int, timeout: float = 30.0):
+        process = self._processes.pop(index, None)
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        deadline = time.monotonic() + timeout
+        while process.is_alive() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if process.is_alive():
+            logger.warning(f"Worker {index} did not stop in {timeout}s; killing it")
+            process.kill()
+        process.join(1)
+
+    async def resize(self, workers: int):
+        """Changes the number of worker processes; their sessions rebalance."""
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        previous, self.workers = self.workers, workers
+        for index in range(previous, workers):
+            self._spawn(index)
+        for index in range(workers, previous):
+            await self._terminate(index)
+        logger.info(f"Resized worker pool from {previous} to {workers}")
+
+    async def _monitor(self):
+        while not self.stop_event.is_set():
+            for index in range(self.workers):
+                process = self._processes.get(index)
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    logger.warning(
+                        f"Worker {index} exited with code {process.exitcode}; restarting"
+                    )
+                self._spawn(index)
+            try:
+                await asyncio.wait_for(
+                    self.stop_event.wait(), timeout=self._restart_delay
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _reload(self):
+        # SIGHUP: pick up a new supervisor_workers value from the config file.
+        workers = load_config(self.config_path).supervisor_workers
+        if workers and workers != self.workers:
+            task = asyncio.create_task(self.resize(workers))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def start(self):
+        await self.bus.start()
+        await self.bus_server.start()
+        for index in range(self.workers):
+            self._spawn(index)
+        # Commands published or replayed before any worker subscribed would
+        # find no consumer.
+        while not self.bus.has_subscribers("agent_commands"):
+            if self.stop_event.is_set():
+                return
+            await asyncio.sleep(0.1)
+        await self.bus.replay_pending()
+        if self.gateway:
+            await self.gateway.start()
+        print(
+            f"Supervisor running {self.workers} workers; bus on {self.socket_path}"
+        )
+        await self._monitor()
+
+    async def stop(self):
+        self.stop_event.set()
+        for task in list(self._tasks):
+            task.cancel()
+        if self.gateway:
+            await self.gateway.stop()
+        await asyncio.gather(*(self._terminate(i) for i in list(self._processes)))
+        await self.bus_server.stop()
+        await self.bus.stop()
+        await self.persistence.close()
+
+
+async def run_supervisor():
+    supervisor = Supervisor()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(supervisor.stop()))
+    loop.add_signal_handler(signal.SIGHUP, supervisor._reload)
+
+    try:
+        await supervisor.start()
+    except Exception as e:
+        print(f"Supervisor error: {e}")
+
+
+def main():
+    asyncio.run(run_supervisor())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import pytest
+from pydantic import ValidationError
+
+from julio.admission import AdmissionController, TokenBucket
+from julio.config import AgentConfig
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_burst_and_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock)
+    assert [bucket.try_take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_take() == 0.5
+    clock.now = 0.5
+    assert bucket.try_take() == 0.0
+    # Refill never exceeds the burst size.
+    clock.now = 100.0
+    assert [bucket.try_take() for _ in range(4)][-1] > 0
+
+
+def test_admission_controller_limits():
+    clock = FakeClock()
+    admission = AdmissionController(
+        max_in_flight=2,
+        user_rate=1.0,
+        user_burst=1,
+        user_rates={"vip": 100.0},
+        max_users=2,
+        clock=clock,
+    )
+    assert admission.try_admit("alice") is None
+    assert admission.try_admit("alice") == ("rate_limited", 1.0)
+    assert admission.try_admit("vip") is None
+    # Two turns are in flight, so even a fresh user is turned away.
+    assert admission.try_admit("bob") == ("overloaded", 1.0)
+    admission.release()
+    assert admission.try_admit("bob") is None
+    assert admission.rejected == {"overloaded": 1, "rate_limited": 1}
+    # Only the most recently seen users keep a bucket.
+    assert list(admission._buckets) == ["vip", "bob"]
+
+
+def test_rate_limits_must_be_positive():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValidationError):
+        AgentConfig(user_rate_limits_per_minute={"mallory": 0})
+    with pytest.raises(ValidationError):
+        AgentConfig(user_rate_limit_per_minute=-1)
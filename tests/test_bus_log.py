@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from julio.bus import MessageBus, Priority
+from julio.bus_log import CommandLog
+
+
+@pytest.mark.asyncio
+async def test_command_log_recovers_unacked_entries(tmp_path):
+    path = str(tmp_path / "bus.db")
+    log = CommandLog(path)
+    await log.open()
+    first = await log.append("agent_commands", {"content": "one"}, Priority.NORMAL)
+    second = await log.append("agent_commands", {"content": "two"}, Priority.BACKGROUND)
+    log.ack(first)
+    await log.close()
+
+    log = CommandLog(path)
+    await log.open()
+    assert log.take_recovered() == [
+        (second, "agent_commands", int(Priority.BACKGROUND), {"content": "two"})
+    ]
+    assert log.take_recovered() == []
+    # New entries continue after the recovered ids.
+    assert await log.append("agent_commands", {}, Priority.NORMAL) > second
+    await log.close()
+
+
+@pytest.mark.asyncio
+async def test_command_log_group_commit(tmp_path):
+    log = CommandLog(str(tmp_path / "bus.db"), flush_interval=0.01)
+    await log.open()
+
+    commits = 0
+    original_commit = log._db.commit
+
+    async def counting_commit():
+        nonlocal commits
+        commits += 1
+        await original_commit()
+
+    log._db.commit = counting_commit
+    ids = await asyncio.gather(
+        *(log.append("c", {"i": i}, Priority.NORMAL) for i in range(100))
+    )
+    assert sorted(ids) == list(range(1, 101))
+    assert commits == 1
+    await log.close()
+
+
+@pytest.mark.asyncio
+async def test_bus_replays_in_flight_commands(tmp_path):
+    path = str(tmp_path / "bus.db")
+    started = asyncio.Event()
+
+    async def hung(msg):
+        started.set()
+        await asyncio.sleep(10)
+
+    bus = MessageBus(max_tasks=1, command_log=CommandLog(path), durable_channels=["cmds"])
+    await bus.start()
+    await bus.subscribe_to_commands("cmds", hung)
+    await bus.publish_response("cmds", {"content": "in-flight"})
+    await bus.publish_response("cmds", {"content": "queued"})
+    await bus.publish_response("other", {"content": "not durable"})
+    await asyncio.wait_for(started.wait(), timeout=1.0)
+    # Simulates a redeploy: the handler never completes.
+    await bus.stop()
+
+    handled = []
+
+    async def handler(msg):
+        handled.append(msg["content"])
+
+    bus = MessageBus(max_tasks=1, command_log=CommandLog(path), durable_channels=["cmds"])
+    await bus.start()
+    await bus.subscribe_to_commands("cmds", handler)
+    assert await bus.replay_pending() == 2
+    for _ in range(50):
+        if len(handled) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert handled == ["in-flight", "queued"]
+    await bus.stop()
+
+    # Everything was acked, so nothing is replayed a second time.
+    log = CommandLog(path)
+    await log.open()
+    assert log.take_recovered() == []
+    await log.close()
@@ -3,7 +3,8 @@ import logging
 
 import pytest
 
-from julio.bus import MessageBus
+from julio.bus import MessageBus, Priority, RetryPolicy
+from julio.dead_letters import InMemoryDeadLetterStore
 
 
 @pytest.mark.asyncio
@@ -129,3 +130,823 @@ async def test_bus_bounded_queue(caplog):
     assert results[2]["id"] == 3
 
     await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_partition_key_preserves_order():
+    bus = MessageBus(max_tasks=4, partition_key="source_id")
+    await bus.start()
+    seen = {"a": [], "b": []}
+    running = set()
+    overlaps = []
+
+    async def sub(msg):
+        key = msg["source_id"]
+        if key in running:
+            overlaps.append(key)
+        running.add(key)
+        await asyncio.sleep(0.005)
+        seen[key].append(msg["i"])
+        running.discard(key)
+
+    await bus.subscribe_to_commands("test", sub)
+    for i in range(5):
+        await bus.publish_response("test", {"source_id": "a", "i": i})
+        await bus.publish_response("test", {"source_id": "b", "i": i})
+
+    for _ in range(100):
+        if len(seen["a"]) == 5 and len(seen["b"]) == 5:
+            break
+        await asyncio.sleep(0.01)
+
+    assert seen["a"] == list(range(5))
+    assert seen["b"] == list(range(5))
+    assert overlaps == []
+    assert bus._lanes == {}
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_partition_keys_run_in_parallel():
+    bus = MessageBus(max_tasks=2, partition_key="source_id")
+    await bus.start()
+    both_running = asyncio.Event()
+    running = set()
+
+    async def sub(msg):
+        running.add(msg["source_id"])
+        if len(running) == 2:
+            both_running.set()
+        await asyncio.wait_for(both_running.wait(), timeout=1.0)
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"source_id": "a"})
+    await bus.publish_response("test", {"source_id": "b"})
+
+    await asyncio.wait_for(both_running.wait(), timeout=1.0)
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_parked_messages_count_towards_capacity(caplog):
+    bus = MessageBus(max_tasks=2, max_queue_size=2, partition_key="source_id")
+    await bus.start()
+    release = asyncio.Event()
+
+    async def sub(msg):
+        await release.wait()
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"source_id": "a", "i": 0})
+    await asyncio.sleep(0.01)
+    await bus.publish_response("test", {"source_id": "a", "i": 1})
+    await bus.publish_response("test", {"source_id": "a", "i": 2})
+
+    with caplog.at_level(logging.WARNING):
+        await bus.publish_response("test", {"source_id": "a", "i": 3})
+    assert "queue full (2)" in caplog.text
+
+    release.set()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_priority_order():
+    bus = MessageBus(max_tasks=1)
+    await bus.start()
+    gate = asyncio.Event()
+    order = []
+
+    async def sub(msg):
+        if msg["id"] == "blocker":
+            await gate.wait()
+        order.append(msg["id"])
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": "blocker"})
+    await asyncio.sleep(0.01)
+
+    await bus.publish_response("test", {"id": "bg"}, Priority.BACKGROUND)
+    await bus.publish_response("test", {"id": "normal"})
+    await bus.publish_response("test", {"id": "interactive"}, Priority.INTERACTIVE)
+
+    gate.set()
+    for _ in range(50):
+        if len(order) == 4:
+            break
+        await asyncio.sleep(0.01)
+
+    assert order == ["blocker", "interactive", "normal", "bg"]
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_priority_starvation_protection():
+    bus = MessageBus(max_tasks=1, starvation_limit=2)
+    await bus.start()
+    gate = asyncio.Event()
+    order = []
+
+    async def sub(msg):
+        if msg["id"] == "blocker":
+            await gate.wait()
+        order.append(msg["id"])
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": "blocker"})
+    await asyncio.sleep(0.01)
+
+    await bus.publish_response("test", {"id": "bg"}, Priority.BACKGROUND)
+    for i in range(5):
+        await bus.publish_response("test", {"id": i}, Priority.INTERACTIVE)
+
+    gate.set()
+    for _ in range(50):
+        if len(order) == 7:
+            break
+        await asyncio.sleep(0.01)
+
+    # The background message is served after being skipped twice.
+    assert order == ["blocker", 0, 1, "bg", 2, 3, 4]
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_fair_share_across_tenants():
+    bus = MessageBus(max_tasks=1, fair_key="user_id", fair_weights={"heavy": 2})
+    await bus.start()
+    gate = asyncio.Event()
+    order = []
+
+    async def sub(msg):
+        if msg["user_id"] == "blocker":
+            await gate.wait()
+        order.append(msg["user_id"])
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"user_id": "blocker"})
+    await asyncio.sleep(0.01)
+
+    for _ in range(6):
+        await bus.publish_response("test", {"user_id": "noisy"})
+    for _ in range(4):
+        await bus.publish_response("test", {"user_id": "heavy"})
+    await bus.publish_response("test", {"user_id": "quiet"})
+
+    gate.set()
+    for _ in range(50):
+        if len(order) == 12:
+            break
+        await asyncio.sleep(0.01)
+
+    assert order[1:] == [
+        "noisy", "heavy", "heavy", "quiet",
+        "noisy", "heavy", "heavy",
+        "noisy", "noisy", "noisy", "noisy",
+    ]
+    await bus.stop()
+
+
+def test_bus_rejects_non_positive_weights():
+    with pytest.raises(ValueError):
+        MessageBus(fair_key="user_id", fair_weights={"u": 0})
+
+
+@pytest.mark.asyncio
+async def test_bus_publish_waits_for_capacity():
+    bus = MessageBus(max_tasks=1, max_queue_size=1)
+    await bus.start()
+    gate = asyncio.Event()
+    results = []
+
+    async def sub(msg):
+        await gate.wait()
+        results.append(msg["id"])
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": 1})
+    await asyncio.sleep(0.01)
+    assert await bus.publish_response("test", {"id": 2})
+    assert bus.credits() == 0
+
+    publish = asyncio.create_task(
+        bus.publish_response("test", {"id": 3}, wait=True, timeout=1.0)
+    )
+    await asyncio.sleep(0.01)
+    assert not publish.done()
+
+    gate.set()
+    assert await publish is True
+    for _ in range(50):
+        if len(results) == 3:
+            break
+        await asyncio.sleep(0.01)
+    assert results == [1, 2, 3]
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_publish_wait_times_out(caplog):
+    bus = MessageBus(max_tasks=1, max_queue_size=1)
+    await bus.start()
+    gate = asyncio.Event()
+
+    async def sub(msg):
+        await gate.wait()
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": 1})
+    await asyncio.sleep(0.01)
+    await bus.publish_response("test", {"id": 2})
+
+    with caplog.at_level(logging.WARNING):
+        delivered = await bus.publish_response(
+            "test", {"id": 3}, wait=True, timeout=0.05
+        )
+    assert delivered is False
+    assert "queue full (1)" in caplog.text
+
+    gate.set()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_watermark_hysteresis():
+    bus = MessageBus(
+        max_tasks=1, max_queue_size=10, high_watermark=0.5, low_watermark=0.2
+    )
+    await bus.start()
+    gate = asyncio.Event()
+
+    async def sub(msg):
+        await gate.wait()
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": "blocker"})
+    await asyncio.sleep(0.01)
+
+    for i in range(4):
+        await bus.publish_response("test", {"id": i})
+    assert not bus.congested
+    await bus.publish_response("test", {"id": 4})
+    assert bus.congested
+    assert bus.credits() == 5
+
+    gate.set()
+    for _ in range(50):
+        if bus.depth == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert not bus.congested
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_pool_scales_up_and_reaps_idle_workers():
+    bus = MessageBus(max_tasks=5, min_tasks=1, idle_timeout=0.05)
+    await bus.start()
+    gate = asyncio.Event()
+    done = []
+
+    async def sub(msg):
+        await gate.wait()
+        done.append(msg)
+
+    await bus.subscribe_to_commands("test", sub)
+    for i in range(5):
+        await bus.publish_response("test", {"i": i})
+    await asyncio.sleep(0.01)
+
+    stats = bus.pool_stats()
+    assert stats["workers"] == 5
+    assert stats["idle"] == 0
+    assert {d["action"] for d in stats["decisions"]} == {"scale_up"}
+
+    gate.set()
+    for _ in range(50):
+        if bus.pool_stats()["workers"] == 1:
+            break
+        await asyncio.sleep(0.02)
+
+    stats = bus.pool_stats()
+    assert len(done) == 5
+    assert stats["workers"] == 1
+    assert stats["reaped_total"] == 4
+    assert stats["decisions"][-1]["action"] == "scale_down"
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_pool_keeps_min_workers():
+    bus = MessageBus(max_tasks=4, min_tasks=2, idle_timeout=0.01)
+    await bus.start()
+    await asyncio.sleep(0.05)
+    assert bus.pool_stats()["workers"] == 2
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_request_reply():
+    bus = MessageBus(max_tasks=2)
+    await bus.start()
+    fanned_out = []
+
+    async def handler(msg):
+        await bus.publish_response(
+            "replies",
+            {"content": msg["content"].upper(), "correlation_id": msg["correlation_id"]},
+        )
+
+    async def listener(msg):
+        fanned_out.append(msg)
+
+    await bus.subscribe_to_commands("requests", handler)
+    await bus.subscribe_to_commands("replies", listener)
+
+    first, second = await asyncio.gather(
+        bus.request("requests", {"content": "a"}, reply_channel="replies", timeout=1.0),
+        bus.request("requests", {"content": "b"}, reply_channel="replies", timeout=1.0),
+    )
+    assert first["content"] == "A"
+    assert second["content"] == "B"
+    assert bus._pending_replies == {}
+
+    # Replies are still delivered to regular subscribers.
+    await asyncio.sleep(0.01)
+    assert len(fanned_out) == 2
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_request_timeout():
+    bus = MessageBus(max_tasks=1)
+    await bus.start()
+
+    async def silent(msg):
+        pass
+
+    await bus.subscribe_to_commands("requests", silent)
+    with pytest.raises(TimeoutError):
+        await bus.request("requests", {"content": "a"}, reply_channel="r", timeout=0.05)
+    assert bus._pending_replies == {}
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_metrics_snapshot_and_prometheus(caplog):
+    bus = MessageBus(max_tasks=1, max_queue_size=2)
+    await bus.start()
+    gate = asyncio.Event()
+
+    async def sub(msg):
+        await gate.wait()
+        if msg["id"] == 2:
+            raise ValueError("Boom")
+
+    await bus.subscribe_to_commands("test", sub)
+    await bus.publish_response("test", {"id": 1})
+    await asyncio.sleep(0.01)
+    await bus.publish_response("test", {"id": 2})
+    await bus.publish_response("test", {"id": 3})
+    await bus.publish_response("test", {"id": 4})
+
+    snap = bus.metrics_snapshot()
+    assert snap["workers"] == 1
+    channel = snap["channels"]["test"]
+    assert channel["published"] == 4
+    assert channel["enqueued"] == 3
+    assert channel["dropped"] == 1
+    assert channel["depth"] == 2
+
+    gate.set()
+    for _ in range(50):
+        if bus.metrics_snapshot()["channels"]["test"]["depth"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+
+    channel = bus.metrics_snapshot()["channels"]["test"]
+    assert channel["handled"] == 2
+    assert channel["errors"] == 1
+    assert channel["handler_duration_seconds"]["count"] == 3
+    assert channel["queue_wait_seconds"]["buckets"]["+Inf"] == 3
+
+    text = bus.render_metrics()
+    assert 'julio_bus_dropped_total{channel="test"} 1' in text
+    assert 'julio_bus_handler_duration_seconds_bucket{channel="test",le="+Inf"} 3' in text
+    assert "julio_bus_workers 1" in text
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_metrics_server():
+    from julio.bus_metrics import MetricsServer
+
+    bus = MessageBus()
+    await bus.start()
+    await bus.publish_response("test", {})
+    server = MetricsServer(bus, port=0)
+    await server.start()
+
+    async def fetch(path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+        return data.decode()
+
+    assert 'julio_bus_published_total{channel="test"} 1' in await fetch("/metrics")
+    assert '"published":1' in await fetch("/metrics.json")
+    assert "404 Not Found" in await fetch("/other")
+
+    await server.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_subscriber_timeout(caplog):
+    bus = MessageBus(max_tasks=1)
+    await bus.start()
+    handled = []
+
+    async def hung(msg):
+        if msg["id"] == 1:
+            await asyncio.sleep(10)
+        handled.append(msg["id"])
+
+    await bus.subscribe_to_commands("test", hung, timeout=0.05)
+    with caplog.at_level(logging.ERROR):
+        await bus.publish_response("test", {"id": 1})
+        await bus.publish_response("test", {"id": 2})
+        for _ in range(50):
+            if handled:
+                break
+            await asyncio.sleep(0.01)
+
+    # The hung delivery released the only worker for the next one.
+    assert handled == [2]
+    assert "timed out after 0.05s" in caplog.text
+    assert bus.metrics_snapshot()["channels"]["test"]["timeouts"] == 1
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_bulkhead_leaves_workers_for_other_subscribers():
+    bus = MessageBus(max_tasks=3)
+    await bus.start()
+    gate = asyncio.Event()
+    slow_running = 0
+    max_slow_running = 0
+    commands = []
+
+    async def slow_responses(msg):
+        nonlocal slow_running, max_slow_running
+        slow_running += 1
+        max_slow_running = max(max_slow_running, slow_running)
+        await gate.wait()
+        slow_running -= 1
+
+    async def commands_sub(msg):
+        commands.append(msg["id"])
+
+    await bus.subscribe_to_commands("responses", slow_responses, max_concurrency=1)
+    await bus.subscribe_to_commands("commands", commands_sub)
+    for i in range(5):
+        await bus.publish_response("responses", {"id": i})
+    await bus.publish_response("commands", {"id": "cmd"})
+
+    for _ in range(50):
+        if commands:
+            break
+        await asyncio.sleep(0.01)
+    assert commands == ["cmd"]
+    assert bus.depth == 4
+
+    gate.set()
+    for _ in range(50):
+        if bus.depth == 0 and slow_running == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert max_slow_running == 1
+    assert bus.metrics_snapshot()["channels"]["responses"]["handled"] == 5
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_circuit_breaker_sheds_failing_subscriber():
+    bus = MessageBus(max_tasks=1)
+    await bus.start()
+    calls = []
+
+    async def failing(msg):
+        calls.append(msg["id"])
+        raise ValueError("Boom")
+
+    await bus.subscribe_to_commands(
+        "test", failing, failure_threshold=2, reset_timeout=0.1
+    )
+    for i in range(5):
+        await bus.publish_response("test", {"id": i})
+    for _ in range(50):
+        if bus.depth == 0:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+
+    assert calls == [0, 1]
+    assert bus.metrics_snapshot()["channels"]["test"]["shed"] == 3
+
+    # After the reset timeout a single trial delivery is let through.
+    await asyncio.sleep(0.15)
+    await bus.publish_response("test", {"id": 5})
+    await bus.publish_response("test", {"id": 6})
+    await asyncio.sleep(0.05)
+    assert calls == [0, 1, 5]
+    await bus.stop()
+
+
+def test_retry_policy_backoff():
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=5.0, jitter=0.0)
+    assert [policy.delay(n) for n in range(1, 5)] == [1.0, 2.0, 4.0, 5.0]
+
+    jittered = RetryPolicy(base_delay=1.0, jitter=0.5)
+    assert all(0.5 <= jittered.delay(1) <= 1.0 for _ in range(20))
+
+
+@pytest.mark.asyncio
+async def test_bus_retries_then_dead_letters_and_replays():
+    store = InMemoryDeadLetterStore()
+    bus = MessageBus(
+        max_tasks=2,
+        partition_key="source_id",
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, jitter=0.0),
+        dead_letters=store,
+    )
+    await bus.start()
+    attempts = []
+    handled = []
+    healthy = False
+
+    async def flaky(msg):
+        attempts.append(msg["id"])
+        if msg["id"] == 1 and not healthy:
+            raise ValueError("transient")
+        handled.append(msg["id"])
+
+    await bus.subscribe_to_commands("test", flaky)
+    await bus.publish_response("test", {"source_id": "s", "id": 1})
+    await bus.publish_response("test", {"source_id": "s", "id": 2})
+
+    for _ in range(100):
+        if handled:
+            break
+        await asyncio.sleep(0.01)
+
+    # Retries hold the session lane, so message 2 waits for message 1.
+    assert attempts == [1, 1, 1, 2]
+    letters = await bus.dead_letters("test")
+    assert len(letters) == 1
+    assert letters[0]["message"]["id"] == 1
+    assert letters[0]["attempts"] == 3
+    assert "transient" in letters[0]["error"]
+    channel = bus.metrics_snapshot()["channels"]["test"]
+    assert channel["retries"] == 2
+    assert channel["dead_lettered"] == 1
+
+    healthy = True
+    assert await bus.replay_dead_letters() == 1
+    for _ in range(50):
+        if len(handled) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert handled == [2, 1]
+    assert await bus.dead_letters() == []
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_skips_expired_messages():
+    store = InMemoryDeadLetterStore()
+    bus = MessageBus(
+        max_tasks=1,
+        message_ttls={"test": 0.05},
+        dead_letter_expired=True,
+        dead_letters=store,
+    )
+    await bus.start()
+    handled = []
+    release = asyncio.Event()
+
+    async def slow(msg):
+        handled.append(msg["id"])
+        if msg["id"] == 1:
+            await release.wait()
+
+    await bus.subscribe_to_commands("test", slow)
+    await bus.publish_response("test", {"id": 1}, ttl=10)
+    await bus.publish_response("test", {"id": 2})
+    await bus.publish_response("test", {"id": 3}, ttl=10)
+    # Message 2 outlives its channel default TTL behind the slow first one.
+    await asyncio.sleep(0.1)
+    release.set()
+
+    for _ in range(50):
+        if len(handled) == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert handled == [1, 3]
+    assert bus.metrics_snapshot()["channels"]["test"]["expired"] == 1
+    letters = await bus.dead_letters("test")
+    assert [letter["message"]["id"] for letter in letters] == [2]
+    assert letters[0]["error"] == "expired"
+
+    # Replayed expired messages get a fresh TTL instead of expiring again.
+    assert await bus.replay_dead_letters("test") == 1
+    for _ in range(50):
+        if len(handled) == 3:
+            break
+        await asyncio.sleep(0.01)
+    assert handled == [1, 3, 2]
+    assert await bus.dead_letters("test") == []
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_coalesces_busy_lane():
+    from julio.main import coalesce_commands
+
+    bus = MessageBus(max_tasks=2, partition_key="source_id")
+    await bus.start()
+    turns = []
+    release = asyncio.Event()
+
+    async def handler(msg):
+        turns.append(msg["content"])
+        if msg["content"] == "first":
+            await release.wait()
+        reply = {"content": f"done: {msg['content']}"}
+        for key in ("correlation_id", "correlation_ids"):
+            if key in msg:
+                reply[key] = msg[key]
+        await bus.publish_response("responses", reply)
+
+    await bus.subscribe_to_commands("commands", handler, coalesce=coalesce_commands)
+    await bus.publish_response("commands", {"source_id": "s", "content": "first"})
+    await asyncio.sleep(0.01)
+    await bus.publish_response("commands", {"source_id": "s", "content": "second"})
+    replies = [
+        asyncio.create_task(
+            bus.request(
+                "commands",
+                {"source_id": "s", "content": text},
+                reply_channel="responses",
+                timeout=1,
+            )
+        )
+        for text in ("third", "fourth")
+    ]
+    await asyncio.sleep(0.01)
+    release.set()
+
+    results = await asyncio.gather(*replies)
+    assert turns == ["first", "second\n\nthird\n\nfourth"]
+    assert results[0]["content"] == results[1]["content"] == "done: second\n\nthird\n\nfourth"
+    channel = bus.metrics_snapshot()["channels"]["commands"]
+    assert channel["coalesced"] == 2
+    assert channel["depth"] == 0
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_coalesces_only_same_user_runs():
+    from julio.main import coalesce_commands
+
+    bus = MessageBus(max_tasks=2, partition_key="source_id")
+    await bus.start()
+    turns = []
+    release = asyncio.Event()
+
+    async def handler(msg):
+        turns.append((msg["user_id"], msg["content"]))
+        if msg["content"] == "first":
+            await release.wait()
+
+    await bus.subscribe_to_commands(
+        "commands", handler, coalesce=coalesce_commands, coalesce_key="user_id"
+    )
+    await bus.publish_response("commands", {"source_id": "s", "user_id": "alice", "content": "first"})
+    await asyncio.sleep(0.01)
+    for user, text in [("alice", "a1"), ("alice", "a2"), ("bob", "b1"), ("alice", "a3")]:
+        await bus.publish_response("commands", {"source_id": "s", "user_id": user, "content": text})
+    release.set()
+
+    for _ in range(50):
+        if len(turns) == 4:
+            break
+        await asyncio.sleep(0.01)
+    assert turns == [
+        ("alice", "first"),
+        ("alice", "a1\n\na2"),
+        ("bob", "b1"),
+        ("alice", "a3"),
+    ]
+    with pytest.raises(ValueError):
+        coalesce_commands([{"user_id": "alice"}, {"user_id": "bob"}])
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_request_streams_partial_replies():
+    bus = MessageBus(max_tasks=2, partition_key="source_id")
+    await bus.start()
+
+    async def agent(msg):
+        for seq, text in enumerate(["Hel", "lo"]):
+            await bus.publish_response(
+                "agent_responses",
+                {"source_id": "s", "content": text, "partial": True, "seq": seq,
+                 "correlation_id": msg["correlation_id"]},
+            )
+        await bus.publish_response(
+            "agent_responses",
+            {"source_id": "s", "content": "Hello", "partial": False,
+             "correlation_id": msg["correlation_id"]},
+        )
+
+    await bus.subscribe_to_commands("agent_commands", agent)
+    chunks = []
+    reply = await bus.request(
+        "agent_commands",
+        {"source_id": "s"},
+        timeout=1,
+        on_partial=lambda chunk: chunks.append(chunk["content"]),
+    )
+    assert chunks == ["Hel", "lo"]
+    assert reply["content"] == "Hello"
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_unhashable_routing_fields_do_not_block_lanes():
+    bus = MessageBus(max_tasks=2, partition_key="source_id", fair_key="user_id")
+    await bus.start()
+    handled = []
+
+    async def handler(msg):
+        handled.append(msg["content"])
+
+    await bus.subscribe_to_commands("commands", handler)
+    await bus.publish_response("commands", {"source_id": "victim", "user_id": ["x"], "content": "bad user"})
+    await bus.publish_response("commands", {"source_id": {"a": 1}, "user_id": "u", "content": "bad source"})
+    await bus.publish_response("commands", {"source_id": "victim", "user_id": "u", "content": "ok"})
+
+    for _ in range(50):
+        if len(handled) == 3:
+            break
+        await asyncio.sleep(0.01)
+    assert sorted(handled) == ["bad source", "bad user", "ok"]
+    assert bus.depth == 0
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_bus_acks_log_entry_after_all_deliveries():
+    from julio.bus import _LogEntry
+
+    class FakeLog:
+        def __init__(self):
+            self.acks = []
+
+        def ack(self, entry_id):
+            self.acks.append(entry_id)
+
+        async def close(self):
+            pass
+
+    bus = MessageBus(max_tasks=2, max_queue_size=1)
+    await bus.start()
+    bus._command_log = log = FakeLog()
+    release = asyncio.Event()
+
+    async def fast(msg):
+        pass
+
+    async def slow(msg):
+        await release.wait()
+
+    await bus.subscribe_to_commands("test", fast)
+    await bus.subscribe_to_commands("test", slow)
+    # The queue holds one delivery, so the second waits for the first to be
+    # handled; the entry must survive until the slow one is done too.
+    await bus._dispatch("test", {"n": 1}, Priority.NORMAL, True, None, _LogEntry(7))
+    await asyncio.sleep(0.05)
+    assert log.acks == []
+    release.set()
+    for _ in range(50):
+        if log.acks:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.02)
+    assert log.acks == [7]
+    await bus.stop()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from julio.bus import MessageBus
+from julio.bus_scheduler import CronSchedule
+from julio.persistence import Persistence
+
+
+def test_cron_schedule_next_after():
+    start = datetime(2024, 1, 1, 10, 7, 30, tzinfo=timezone.utc).timestamp()
+
+    def next_run(expression):
+        return datetime.fromtimestamp(
+            CronSchedule(expression).next_after(start), timezone.utc
+        )
+
+    assert next_run("*/15 * * * *") == datetime(2024, 1, 1, 10, 15, tzinfo=timezone.utc)
+    assert next_run("0 9 * * *") == datetime(2024, 1, 2, 9, 0, tzinfo=timezone.utc)
+    # 2024-01-01 is a Monday; the next Saturday is the 6th.
+    assert next_run("30 8 * * 6") == datetime(2024, 1, 6, 8, 30, tzinfo=timezone.utc)
+    assert next_run("0 0 1 3 *") == datetime(2024, 3, 1, 0, 0, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        CronSchedule("61 * * * *")
+
+
+@pytest.mark.asyncio
+async def test_publish_after_and_recurring_schedules():
+    bus = MessageBus(max_tasks=2)
+    received = []
+
+    async def callback(message):
+        received.append(message["kind"])
+
+    await bus.subscribe_to_commands("reminders", callback)
+    await bus.start()
+
+    await bus.publish_after("reminders", {"kind": "late"}, 0.05)
+    await bus.publish_at("reminders", {"kind": "soon"}, time.time() + 0.01)
+    cancelled = await bus.publish_after("reminders", {"kind": "never"}, 0.02)
+    assert await bus.cancel_scheduled(cancelled)
+    recurring = await bus.schedule_recurring(
+        "reminders", {"kind": "tick"}, interval=0.02
+    )
+
+    for _ in range(50):
+        if "late" in received and received.count("tick") >= 3:
+            break
+        await asyncio.sleep(0.01)
+    assert received[0] == "soon"
+    assert "late" in received
+    assert "never" not in received
+    assert received.count("tick") >= 3
+
+    assert await bus.cancel_scheduled(recurring)
+    assert bus.metrics_snapshot()["scheduled"] == 0
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_scheduled_messages_survive_restart(tmp_path):
+    persistence = Persistence(str(tmp_path / "agent.db"))
+    bus = MessageBus(schedule_store=persistence)
+    await bus.start()
+    await bus.publish_after("reminders", {"kind": "follow_up"}, 0.05)
+    await bus.stop()
+
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    bus = MessageBus(schedule_store=persistence)
+    await bus.subscribe_to_commands("reminders", callback)
+    await bus.start()
+    for _ in range(50):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+    assert received == [{"kind": "follow_up"}]
+    assert await persistence.list_scheduled_messages() == []
+    await bus.stop()
+    await persistence.close()
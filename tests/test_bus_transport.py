@@ -0,0 +1,227 @@
+import asyncio
+
+import pytest
+
+from julio.bus import MessageBus, RetryPolicy
+from julio.bus_transport import BusServer, HashRing, RemoteBus
+
+
+async def _serve_bus(tmp_path):
+    bus = MessageBus(
+        max_tasks=4,
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, jitter=0.0),
+    )
+    await bus.start()
+    server = BusServer(bus, str(tmp_path / "bus.sock"))
+    await server.start()
+    return bus, server
+
+
+@pytest.mark.asyncio
+async def test_remote_publish_reaches_local_subscriber(tmp_path):
+    bus, server = await _serve_bus(tmp_path)
+    received = []
+
+    async def callback(msg):
+        received.append(msg["n"])
+
+    await bus.subscribe_to_commands("agent_commands", callback)
+    remote = RemoteBus(server.path, pool_size=2)
+    await remote.start()
+    results = await asyncio.gather(
+        *(remote.publish_response("agent_commands", {"n": n}) for n in range(20))
+    )
+    assert all(results)
+
+    for _ in range(50):
+        if len(received) == 20:
+            break
+        await asyncio.sleep(0.01)
+    assert sorted(received) == list(range(20))
+    await remote.stop()
+    await server.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_shares_messages_and_retries_failures(tmp_path):
+    bus, server = await _serve_bus(tmp_path)
+    handled = {"a": [], "b": []}
+    failed_once = set()
+    consumers = []
+
+    for name in handled:
+        remote = RemoteBus(server.path)
+        await remote.start()
+
+        async def callback(msg, name=name):
+            await asyncio.sleep(0.01)
+            if msg["n"] == 3 and msg["n"] not in failed_once:
+                failed_once.add(msg["n"])
+                raise ValueError("transient")
+            handled[name].append(msg["n"])
+
+        await remote.subscribe_to_commands("agent_commands", callback, group="workers")
+        consumers.append(remote)
+
+    for n in range(10):
+        await bus.publish_response("agent_commands", {"n": n})
+    for _ in range(100):
+        if len(handled["a"]) + len(handled["b"]) == 10:
+            break
+        await asyncio.sleep(0.01)
+
+    # Every message is handled exactly once across the group, including the
+    # one whose first remote attempt failed.
+    assert sorted(handled["a"] + handled["b"]) == list(range(10))
+    assert handled["a"] and handled["b"]
+    assert bus.metrics_snapshot()["channels"]["agent_commands"]["retries"] == 1
+
+    # A named group keeps its subscription while its members restart.
+    for remote in consumers:
+        await remote.stop()
+    await asyncio.sleep(0.05)
+    assert bus.has_subscribers("agent_commands")
+    await server.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_consumer_group_shards_by_route_key(tmp_path):
+    bus, server = await _serve_bus(tmp_path)
+    seen = {}
+    workers = {}
+
+    async def join(name):
+        remote = RemoteBus(server.path)
+        await remote.start()
+
+        async def callback(msg):
+            seen.setdefault(msg["source_id"], set()).add(name)
+
+        await remote.subscribe_to_commands(
+            "agent_commands",
+            callback,
+            group="agent_workers",
+            member=name,
+            route_key="source_id",
+        )
+        workers[name] = remote
+
+    async def publish_round():
+        seen.clear()
+        for n in range(30):
+            await bus.publish_response("agent_commands", {"source_id": f"s{n % 10}"})
+        for _ in range(100):
+            if sum(len(v) for v in seen.values()) >= 10 and bus.depth == 0:
+                break
+            await asyncio.sleep(0.01)
+        return {source: owners.copy() for source, owners in seen.items()}
+
+    for name in ("worker-0", "worker-1", "worker-2"):
+        await join(name)
+    before = await publish_round()
+    # Each session sticks to one worker.
+    assert all(len(owners) == 1 for owners in before.values())
+    assert len(set().union(*before.values())) > 1
+
+    # When a worker leaves, only its sessions move.
+    await workers.pop("worker-2").stop()
+    await asyncio.sleep(0.05)
+    after = await publish_round()
+    for source, owners in before.items():
+        if owners != {"worker-2"}:
+            assert after[source] == owners
+        else:
+            assert len(after[source]) == 1 and "worker-2" not in after[source]
+
+    for remote in workers.values():
+        await remote.stop()
+    await server.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_remote_bus_keeps_one_callback_per_group(tmp_path):
+    bus, server = await _serve_bus(tmp_path)
+    remote = RemoteBus(server.path, pool_size=1)
+    await remote.start()
+    received = {"audit": [], "workers": []}
+    for group in received:
+
+        async def callback(msg, group=group):
+            received[group].append(msg["n"])
+
+        await remote.subscribe_to_commands("agent_commands", callback, group=group)
+
+    # Concurrent publishes on a fresh pool share a single connect.
+    await asyncio.gather(
+        *(remote.publish_response("agent_commands", {"n": n}) for n in range(5))
+    )
+    assert len(server._connections) == 2
+    for _ in range(50):
+        if all(len(v) == 5 for v in received.values()):
+            break
+        await asyncio.sleep(0.01)
+    assert {g: sorted(v) for g, v in received.items()} == {
+        "audit": list(range(5)),
+        "workers": list(range(5)),
+    }
+    await remote.stop()
+    await server.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_remote_subscriptions_survive_connect_errors(tmp_path):
+    bus, server = await _serve_bus(tmp_path)
+    subscribes = []
+    serve_subscribe = server._subscribe
+
+    async def counting_subscribe(conn, frame):
+        subscribes.append(frame["channel"])
+        await serve_subscribe(conn, frame)
+
+    server._subscribe = counting_subscribe
+    remote = RemoteBus(server.path, reconnect_delay=0.01)
+    connect = remote._connect
+    failures = [RuntimeError("unexpected")]
+
+    async def flaky_connect():
+        if failures:
+            raise failures.pop()
+        return await connect()
+
+    remote._connect = flaky_connect
+
+    async def callback(msg):
+        pass
+
+    # Subscribed before the first connect succeeds: the loop replays them.
+    pending = [
+        asyncio.create_task(remote.subscribe_to_commands(channel, callback))
+        for channel in ("agent_commands", "agent_responses")
+    ]
+    await remote.start()
+    await asyncio.wait_for(asyncio.gather(*pending), timeout=2)
+    assert sorted(subscribes) == ["agent_commands", "agent_responses"]
+    await remote.stop()
+    await server.stop()
+    await bus.stop()
+
+
+def test_hash_ring_moves_few_keys():
+    ring = HashRing(["worker-0", "worker-1", "worker-2", "worker-3"])
+    keys = [f"session-{n}" for n in range(2000)]
+    before = {key: ring.lookup(key) for key in keys}
+    assert len(set(before.values())) == 4
+
+    ring.add("worker-4")
+    after = {key: ring.lookup(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    # Only keys claimed by the new node move, roughly a fifth of them.
+    assert all(after[key] == "worker-4" for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.35
+
+    ring.remove("worker-4")
+    assert {key: ring.lookup(key) for key in keys} == before
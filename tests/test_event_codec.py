@@ -0,0 +1,61 @@
+import json
+import sqlite3
+
+import pytest
+
+from julio.event_codec import MAGIC, ZlibCodec, decode, decoding_row_factory, encode, train_zdict
+
+
+def _event(n):
+    return json.dumps(
+        {"author": "agent", "invocation_id": f"inv-{n}", "content": {"role": "model", "parts": [{"text": f"ok {n}"}]}}
+    )
+
+
+def test_codec_round_trip_and_dictionary():
+    plain = ZlibCodec()
+    big = json.dumps({"output": "x" * 5000})
+    stored = encode(big, plain)
+    assert stored.startswith(MAGIC) and len(stored) < 200
+    assert decode(stored, {1: plain}) == big.encode()
+    # Small events are left alone unless compression actually pays off.
+    assert encode('{"a": 1}', plain) == '{"a": 1}'
+    assert encode('{"a": 1}', plain, min_size=0) == '{"a": 1}'
+
+    trained = ZlibCodec(zdict=train_zdict(_event(n) for n in range(50)))
+    small = encode(_event(99), trained, min_size=0)
+    assert len(small) < len(encode(_event(99), plain, min_size=0)) < len(_event(99))
+    assert trained.codec_id != plain.codec_id
+    assert decode(small, {trained.codec_id: trained}) == _event(99).encode()
+
+
+def test_decoding_row_factory():
+    codec = ZlibCodec()
+    db = sqlite3.connect(":memory:")
+    db.row_factory = decoding_row_factory({1: codec})
+    db.execute("CREATE TABLE t (id INTEGER, data)")
+    big = json.dumps({"output": "y" * 1000})
+    db.executemany("INSERT INTO t VALUES (?, ?)", [(1, encode(big, codec)), (2, "{}")])
+    rows = db.execute("SELECT id, data FROM t ORDER BY id").fetchall()
+    assert rows[0]["data"] == big.encode()
+    assert rows[1]["data"] == "{}"
+
+
+def test_codec_ids_are_unique_per_dictionary():
+    from julio.event_codec import EventCodec
+    from julio.persistence import Persistence
+
+    with pytest.raises(TypeError):
+        EventCodec()
+    first, second = ZlibCodec(zdict=b'"author": "agent"'), ZlibCodec(zdict=b'"role": "model"')
+    assert len({1, first.codec_id, second.codec_id}) == 3
+    assert ZlibCodec(level=9, zdict=first.zdict) == first
+
+    class Clash(ZlibCodec):
+        def __init__(self):
+            super().__init__(zdict=b"other")
+            self.codec_id = first.codec_id
+
+    Persistence(":memory:", codec=first, decoders=[first, second])
+    with pytest.raises(ValueError):
+        Persistence(":memory:", codec=first, decoders=[Clash()])
@@ -0,0 +1,159 @@
+import asyncio
+import base64
+import os
+
+import orjson
+import pytest
+
+from julio.bus import MessageBus
+from julio.gateway import Gateway, _Stream, encode_ws_frame, read_ws_message
+
+
+async def _start_echo_agent():
+    bus = MessageBus(max_tasks=4, partition_key="source_id")
+
+    async def agent(command):
+        reply = {"source_id": command.get("source_id"), "content": f"echo: {command['content']}"}
+        if "correlation_id" in command:
+            reply["correlation_id"] = command["correlation_id"]
+        await bus.publish_response("agent_responses", reply)
+
+    await bus.subscribe_to_commands("agent_commands", agent)
+    await bus.start()
+    gateway = Gateway(bus, port=0, keepalive_interval=0.05)
+    await gateway.start()
+    return bus, gateway
+
+
+async def _read_http_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split()[1])
+    length = next(
+        int(line.split(b":")[1])
+        for line in head.split(b"\r\n")
+        if line.lower().startswith(b"content-length")
+    )
+    return status, orjson.loads(await reader.readexactly(length))
+
+
+def _post(path, payload):
+    body = orjson.dumps(payload)
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+
+
+@pytest.mark.asyncio
+async def test_gateway_pipelined_commands_with_replies():
+    bus, gateway = await _start_echo_agent()
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+    # Three requests in one write on a kept-alive connection.
+    writer.write(
+        _post("/commands?wait=1", {"source_id": "a", "content": "one"})
+        + _post("/commands", {"source_id": "a", "content": "two"})
+        + b"GET /missing HTTP/1.1\r\nHost: localhost\r\n\r\n"
+    )
+    await writer.drain()
+
+    status, reply = await _read_http_response(reader)
+    assert status == 200
+    assert reply["content"] == "echo: one"
+    assert await _read_http_response(reader) == (202, {"accepted": True})
+    assert (await _read_http_response(reader))[0] == 404
+
+    writer.write(b"POST /commands HTTP/1.1\r\nContent-Length: 3\r\n\r\nbad")
+    assert (await _read_http_response(reader))[0] == 400
+    writer.close()
+
+    # An unusable Content-Length gets a 400 rather than a dropped connection.
+    for length in (b"abc", b"-1", b"\xb2"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+        writer.write(b"POST /commands HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+        assert (await _read_http_response(reader))[0] == 400
+        writer.close()
+    await gateway.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_gateway_streams_responses_over_sse_and_websocket():
+    bus, gateway = await _start_echo_agent()
+
+    sse_reader, sse_writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+    sse_writer.write(b"GET /events?source_id=a HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await sse_reader.readuntil(b"\r\n\r\n")
+
+    ws_reader, ws_writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+    key = base64.b64encode(os.urandom(16))
+    ws_writer.write(
+        b"GET /ws?source_id=a HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+        b"Connection: Upgrade\r\nSec-WebSocket-Version: 13\r\n"
+        b"Sec-WebSocket-Key: " + key + b"\r\n\r\n"
+    )
+    assert b" 101 " in await ws_reader.readuntil(b"\r\n\r\n")
+    for _ in range(50):
+        if gateway.stream_count == 2:
+            break
+        await asyncio.sleep(0.01)
+
+    # A command sent over the WebSocket is acknowledged, then its reply is
+    # streamed to every client following that session.
+    ws_writer.write(
+        encode_ws_frame(0x1, orjson.dumps({"content": "hi"}), mask=os.urandom(4))
+    )
+    messages = []
+    while len(messages) < 2:
+        opcode, payload = await asyncio.wait_for(read_ws_message(ws_reader, 1 << 20), 1)
+        if opcode == 0x1:
+            messages.append(orjson.loads(payload))
+    assert messages == [{"accepted": True}, {"source_id": "a", "content": "echo: hi"}]
+
+    events = []
+    while not events:
+        line = await asyncio.wait_for(sse_reader.readline(), 1)
+        if line.startswith(b"data: "):
+            events.append(orjson.loads(line[6:]))
+    assert events == [{"source_id": "a", "content": "echo: hi"}]
+    # Idle streams still get keep-alives.
+    assert await asyncio.wait_for(sse_reader.readuntil(b": keep-alive\n\n"), 1)
+
+    ws_writer.write(encode_ws_frame(0x8, b"\x03\xe8", mask=os.urandom(4)))
+    sse_writer.close()
+    ws_writer.close()
+    await gateway.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_gateway_rejects_malformed_and_reserved_fields():
+    bus, gateway = await _start_echo_agent()
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway.port)
+    for command in (
+        {"source_id": ["a"], "content": "hi"},
+        {"source_id": "a", "user_id": 7, "content": "hi"},
+        {"source_id": "a", "content": {"text": "hi"}},
+        {"source_id": "a", "content": "hi", "correlation_id": "someone-else"},
+        {"source_id": "a", "content": "hi", "deadline": 1e12},
+    ):
+        writer.write(_post("/commands", command))
+        status, reply = await _read_http_response(reader)
+        assert status == 400 and "error" in reply
+    writer.close()
+
+    # WebSocket commands go through the same checks.
+    assert "error" in await gateway._ws_command(b'{"content": 1}', "a")
+    assert "error" in await gateway._ws_command(b'{"partial": true}', "a")
+    assert await gateway._ws_command(b'{"content": "hi"}', "a") == {"accepted": True}
+    await gateway.stop()
+    await bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_gateway_stream_buffer_drops_oldest():
+    stream = _Stream("a", max_buffer=2)
+    for n in range(5):
+        stream.offer({"n": n})
+    assert stream.dropped == 3
+    assert [stream.queue.get_nowait()["n"] for _ in range(2)] == [3, 4]
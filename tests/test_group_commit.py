@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from julio.group_commit import GroupCommit
+
+
+@pytest.mark.asyncio
+async def test_group_commit_batches_until_stopped():
+    pending = []
+    batches = []
+
+    async def flush():
+        batches.append(pending[:2])
+        del pending[:2]
+
+    commits = GroupCommit(flush, lambda: len(pending), interval=0.01, max_batch=2)
+    for n in range(5):
+        pending.append(n)
+        commits.wake()
+    # Stopping skips the wait and drains the backlog in max_batch chunks.
+    await commits.stop()
+    assert batches == [[0, 1], [2, 3], [4]]
+
+    # The next wake starts a fresh task.
+    pending.append(5)
+    commits.wake()
+    for _ in range(50):
+        if not pending:
+            break
+        await asyncio.sleep(0.01)
+    assert batches[-1] == [5]
+    await commits.stop()
+
+
+@pytest.mark.asyncio
+async def test_group_commit_abandons_work_when_cancelled():
+    abandoned = []
+
+    async def flush():
+        await asyncio.sleep(10)
+
+    commits = GroupCommit(
+        flush, lambda: 1, interval=0, max_batch=1, abandon=lambda: abandoned.append(True)
+    )
+    commits.wake()
+    await asyncio.sleep(0.01)
+    commits._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await commits._task
+    assert abandoned == [True]
@@ -0,0 +1,42 @@
+from julio.history_cache import HistoryCache
+
+
+def test_history_cache_lru_by_entries_and_bytes():
+    cache = HistoryCache(max_entries=2, max_bytes=100, max_events=3)
+    cache.fill("a", [{"n": 2}, {"n": 1}], [10, 10], True, cache.generation)
+    assert cache.get("a", 10) == [{"n": 2}, {"n": 1}]
+    # Only two of five events are known, so a larger window is a miss.
+    cache.fill("b", [{"n": 5}, {"n": 4}], [10, 10], False, cache.generation)
+    assert cache.get("b", 2) == [{"n": 5}, {"n": 4}]
+    assert cache.get("b", 3) is None
+
+    cache.fill("c", [{"n": 1}], [10], True, cache.generation)
+    assert cache.get("a", 1) is None  # least recently used session evicted
+    cache.fill("d", [{"n": 1}], [95], True, cache.generation)
+    assert len(cache) == 1 and cache.nbytes == 95
+
+    # A fill that raced a write is not stored.
+    generation = cache.generation
+    cache.append("x", {"n": 1}, 1, 1.0)
+    cache.fill("e", [], [], True, generation)
+    assert cache.get("e", 1) is None
+    generation = cache.generation
+    cache.record_write()
+    cache.fill("e", [], [], True, generation)
+    assert "e" not in cache
+
+
+def test_history_cache_updated_on_append():
+    cache = HistoryCache(max_events=2)
+    cache.reset("s")
+    cache.append("s", {"timestamp": 1.0}, 5, 1.0)
+    cache.append("s", {"timestamp": 2.0}, 5, 2.0)
+    assert cache.get("s", 10) == [{"timestamp": 2.0}, {"timestamp": 1.0}]
+    cache.append("s", {"timestamp": 3.0}, 5, 3.0)
+    # The oldest event fell out, so only two-event windows can be served.
+    assert cache.get("s", 2) == [{"timestamp": 3.0}, {"timestamp": 2.0}]
+    assert cache.get("s", 3) is None
+    assert cache.nbytes == 10
+    # An out-of-order write drops the session rather than misordering it.
+    cache.append("s", {"timestamp": 0.5}, 5, 0.5)
+    assert len(cache) == 0 and cache.nbytes == 0
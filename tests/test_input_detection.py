@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import MagicMock, AsyncMock
 from julio.agent import AgentWrapper
 from julio.config import AgentConfig
+from google.adk.agents.run_config import StreamingMode
 from google.adk.events import Event
 from google.genai import types
 
@@ -111,3 +112,55 @@ async def test_input_detection_none():
     result = await wrapper.process_command(mock_runner, "session1", "user1", "hello")
     assert result["content"] == "Everything is fine."
     assert result["needs_input"] is False
+
+
+@pytest.mark.asyncio
+async def test_streaming_chunks():
+    config = AgentConfig(gemini_api_key="key", mcp_servers=[])
+    skills_loader = MagicMock()
+    skills_loader.load_skills = AsyncMock(return_value="Skills")
+    mcp_manager = MagicMock()
+    mcp_manager.get_toolsets.return_value = []
+    persistence = MagicMock()
+    wrapper = await AgentWrapper.create(config, skills_loader, mcp_manager, persistence)
+
+    mock_runner = MagicMock()
+
+    # Simulate partial events followed by the aggregated final event
+    def text_event(text, partial=None):
+        return Event(
+            invocation_id="test",
+            author="agent_service",
+            partial=partial,
+            content=types.Content(parts=[types.Part(text=text)]),
+        )
+
+    events = [
+        text_event("Hel", partial=True),
+        text_event("lo. ", partial=True),
+        text_event("Hello. "),
+        text_event("Done."),
+    ]
+
+    def mock_gen(*args, **kwargs):
+        async def gen():
+            for event in events:
+                yield event
+
+        return gen()
+
+    mock_runner.run_async.side_effect = mock_gen
+
+    chunks = []
+
+    async def on_chunk(text):
+        chunks.append(text)
+
+    result = await wrapper.process_command(
+        mock_runner, "session1", "user1", "hello", on_chunk=on_chunk
+    )
+    # Aggregated text is not repeated; later whole events stream as they come.
+    assert chunks == ["Hel", "lo. ", "Done."]
+    assert result["content"] == "Hello. Done."
+    run_config = mock_runner.run_async.call_args.kwargs["run_config"]
+    assert run_config.streaming_mode == StreamingMode.SSE
@@ -2,6 +2,7 @@ import pytest
 import asyncio
 import json
 import os
+import sqlite3
 from julio.persistence import Persistence
 
 @pytest.mark.asyncio
@@ -45,3 +46,237 @@ async def test_persistence_shared_connection(tmp_path):
 
     await p.close()
     assert p._db is None
+
+@pytest.mark.asyncio
+async def test_persistence_dead_letters(tmp_path):
+    from julio.dead_letters import PersistentDeadLetterStore
+
+    p = Persistence(str(tmp_path / "test_dead_letters.db"))
+    store = PersistentDeadLetterStore(p)
+    letter = {
+        "channel": "agent_commands",
+        "message": {"source_id": "s", "content": "hi"},
+        "priority": 1,
+        "error": "ValueError('x')",
+        "attempts": 3,
+        "failed_at": 1000.0,
+    }
+    first = await store.add(letter)
+    await store.add({**letter, "channel": "other"})
+
+    letters = await store.list("agent_commands")
+    assert len(letters) == 1
+    assert letters[0]["id"] == first
+    assert letters[0]["message"] == {"source_id": "s", "content": "hi"}
+    assert len(await store.list()) == 2
+
+    await store.remove([first])
+    assert [l["channel"] for l in await store.list()] == ["other"]
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_wal_with_read_pool(tmp_path):
+    p = Persistence(str(tmp_path / "test_wal.db"), read_pool_size=2)
+    db = await p.get_connection()
+    async with db.execute("PRAGMA journal_mode") as cursor:
+        assert (await cursor.fetchone())[0] == "wal"
+
+    service = p.session_service
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    assert (await service.get_session(app_name="app", user_id="u", session_id="s")).id == "s"
+    listed = await service.list_sessions(app_name="app", user_id="u")
+    assert [s.id for s in listed.sessions] == [session.id]
+
+    # Concurrent readers get distinct read-only connections, up to the bound.
+    async with p.read_connection() as r1, p.read_connection() as r2:
+        assert r1 is not r2 and db not in (r1, r2)
+        with pytest.raises(Exception):
+            await r1.execute("DELETE FROM sessions")
+        waiter = asyncio.create_task(p.read_connection().__aenter__())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+    assert await waiter in (r1, r2)
+    assert len(p._readers) == 2
+
+    # A failed write transaction is rolled back instead of leaking into the next commit.
+    with pytest.raises(RuntimeError):
+        async with p.write_connection() as conn:
+            await conn.execute("DELETE FROM sessions")
+            raise RuntimeError("boom")
+    assert (await service.get_session(app_name="app", user_id="u", session_id="s")) is not None
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_group_commits_session_writes(tmp_path):
+    from google.adk.events import Event
+
+    p = Persistence(str(tmp_path / "test_batch.db"), write_batch_interval=0.01)
+    service = p.session_service
+    sessions = await asyncio.gather(
+        *(service.create_session(app_name="app", user_id="u", session_id=f"s{i}") for i in range(5))
+    )
+    db = await p.get_connection()
+    commits = []
+    commit = db.commit
+
+    async def counting_commit():
+        commits.append(1)
+        await commit()
+
+    db.commit = counting_commit
+    stale = sessions[0].model_copy(deep=True)
+    stale.id = "missing"
+    results = await asyncio.gather(
+        *(
+            service.append_event(s, Event(author="user", invocation_id="inv"))
+            for s in [*sessions, stale]
+        ),
+        return_exceptions=True,
+    )
+    # One commit for all writes; the failing one is rolled back on its own.
+    assert len(commits) == 1
+    assert isinstance(results[-1], ValueError)
+    for s in sessions:
+        stored = await service.get_session(app_name="app", user_id="u", session_id=s.id)
+        assert len(stored.events) == 1
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_history_cache_follows_appends(tmp_path):
+    from google.adk.events import Event
+    from julio.history_cache import HistoryCache
+
+    p = Persistence(str(tmp_path / "test_cache.db"), history_cache=HistoryCache())
+    service = p.session_service
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    for n in range(3):
+        await service.append_event(
+            session, Event(author="user", invocation_id=f"inv{n}", timestamp=float(n + 1))
+        )
+    history = await p.get_history("s", "u", limit=10)
+    assert [e["invocation_id"] for e in history] == ["inv2", "inv1", "inv0"]
+    assert (p.history_cache.hits, p.history_cache.misses) == (1, 0)
+
+    # A cold cache is filled from SQLite with the same events.
+    p.history_cache.discard(("s", "u"))
+    assert await p.get_history("s", "u", limit=10) == history
+    assert await p.get_history("s", "u", limit=2) == history[:2]
+    assert p.history_cache.misses == 1
+
+    # Appends to sessions nobody has read leave the cache alone.
+    p.history_cache.discard(("s", "u"))
+    await service.append_event(session, Event(author="user", invocation_id="inv3", timestamp=4.0))
+    assert ("s", "u") not in p.history_cache
+    assert (await p.get_history("s", "u", limit=1))[0]["invocation_id"] == "inv3"
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_iter_history_pages_both_ways(tmp_path):
+    p = Persistence(str(tmp_path / "test_iter.db"))
+    async with p.session_service._get_db_connection() as conn:
+        await conn.execute(
+            "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) VALUES (?, ?, ?, ?, ?, ?)",
+            ("app1", "uid1", "sid1", "{}", 0, 0)
+        )
+        # Several events share a timestamp, so pages must break ties on id.
+        for n in range(7):
+            await conn.execute(
+                "INSERT INTO events (id, app_name, user_id, session_id, invocation_id, timestamp, event_data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (f"e{n}", "app1", "uid1", "sid1", "inv", float(n // 3), json.dumps({"n": n}))
+            )
+        await conn.commit()
+
+    newest = [e["n"] async for e in p.iter_history("sid1", "uid1", chunk_size=2)]
+    assert newest == [6, 5, 4, 3, 2, 1, 0]
+    oldest = [
+        e["n"] async for e in p.iter_history("sid1", "uid1", newest_first=False, chunk_size=3)
+    ]
+    assert oldest == list(range(7))
+    assert [e async for e in p.iter_history("other", "uid1")] == []
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_compresses_events_and_migrates(tmp_path):
+    from google.adk.events import Event
+    from google.genai import types
+    from julio.event_codec import MAGIC, ZlibCodec
+
+    db_path = str(tmp_path / "test_codec.db")
+    p = Persistence(db_path)
+    service = p.session_service
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    big = types.Content(role="model", parts=[types.Part(text="tool output " * 500)])
+    await service.append_event(session, Event(author="agent", invocation_id="old", content=big))
+    await p.close()
+
+    p = Persistence(db_path, codec=ZlibCodec())
+    service = p.session_service
+    session = await service.get_session(app_name="app", user_id="u", session_id="s")
+    await service.append_event(session, Event(author="agent", invocation_id="new", content=big))
+
+    async def stored_types():
+        db = await p.get_connection()
+        db.row_factory = None
+        async with db.execute("SELECT invocation_id, event_data FROM events ORDER BY rowid") as cursor:
+            rows = await cursor.fetchall()
+        await p._configure(db)
+        return [(inv, isinstance(data, bytes) and data.startswith(MAGIC)) for inv, data in rows]
+
+    # New events are compressed; old plain rows keep reading fine.
+    assert await stored_types() == [("old", False), ("new", True)]
+    history = await p.get_history("s", "u")
+    assert [e["invocation_id"] for e in history] == ["new", "old"]
+    assert history[0]["content"] == history[1]["content"]
+    restored = await service.get_session(app_name="app", user_id="u", session_id="s")
+    assert [e.invocation_id for e in restored.events] == ["old", "new"]
+
+    assert await p.migrate_event_data(batch_size=1) == 1
+    assert await stored_types() == [("old", True), ("new", True)]
+    p.codec = None
+    assert await p.migrate_event_data() == 2
+    assert await stored_types() == [("old", False), ("new", False)]
+    assert [e["invocation_id"] for e in await p.get_history("s", "u")] == ["new", "old"]
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_migration_does_not_leak_raw_rows_to_readers(tmp_path):
+    from google.adk.events import Event
+    from google.genai import types
+    from julio.event_codec import ZlibCodec
+
+    # Without a read pool, readers share the writer's connection.
+    p = Persistence(str(tmp_path / "test_shared.db"), read_pool_size=0, codec=ZlibCodec())
+    service = p.session_service
+    session = await service.create_session(app_name="app", user_id="u", session_id="s")
+    big = types.Content(role="model", parts=[types.Part(text="tool output " * 500)])
+    for n in range(3):
+        await service.append_event(
+            session, Event(author="agent", invocation_id=f"inv{n}", content=big)
+        )
+
+    p.codec = ZlibCodec(level=9, zdict=b'"text": "tool output tool output "')
+    results = await asyncio.gather(
+        p.migrate_event_data(batch_size=1),
+        *(p.get_history("s", "u") for _ in range(5)),
+    )
+    assert results[0] == 3
+    for history in results[1:]:
+        assert [e["invocation_id"] for e in history] == ["inv2", "inv1", "inv0"]
+    await p.close()
+
+@pytest.mark.asyncio
+async def test_persistence_write_batcher_survives_connection_failure(tmp_path):
+    p = Persistence(str(tmp_path / "missing" / "x.db"))
+    # Every write fails promptly instead of hanging behind a dead flusher.
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            await asyncio.wait_for(
+                p.session_service.create_session(app_name="app", user_id="u"), 1
+            )
+    await asyncio.wait_for(p.close(), 1)
+
+    # Once the database is reachable, batched writes go through again.
+    os.makedirs(tmp_path / "missing")
+    session = await p.session_service.create_session(app_name="app", user_id="u", session_id="s")
+    assert session.id == "s"
+    await p.close()
@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
+from julio.admission import AdmissionController
 from julio.main import AgentService
 
 
@@ -19,6 +20,18 @@ async def test_agent_service():
         config.mcp_servers = []
         config.skills_path = "skills"
         config.heartbeat_interval_minutes = 0.001  # very short for test
+        config.bus_wal_path = None
+        config.metrics_port = None
+        config.bus_persist_schedules = False
+        config.command_ttl_seconds = None
+        config.coalesce_commands = False
+        config.stream_responses = False
+        config.runner_pool_size = 1
+        config.max_concurrent_turns = None
+        config.user_rate_limit_per_minute = None
+        config.user_rate_limits_per_minute = {}
+        config.bus_socket_path = None
+        config.gateway_port = None
         mock_load_config.return_value = config
 
         # Mocking persistence and agent
@@ -47,6 +60,24 @@ async def test_agent_service():
         mock_agent_instance.process_command.assert_called()
         mock_bus.return_value.publish_response.assert_called()
 
+        # Replies to request() callers carry the correlation id back
+        await service._handle_command(
+            {"source_id": "s", "user_id": "u", "content": "c", "correlation_id": "cid"}
+        )
+        reply = mock_bus.return_value.publish_response.call_args.args[1]
+        assert reply["correlation_id"] == "cid"
+
+        # Over the in-flight ceiling the command is refused without a turn
+        service.admission = AdmissionController(max_in_flight=0)
+        calls = mock_agent_instance.process_command.call_count
+        await service._handle_command(
+            {"source_id": "s", "user_id": "u", "content": "c", "correlation_id": "cid"}
+        )
+        assert mock_agent_instance.process_command.call_count == calls
+        reply = mock_bus.return_value.publish_response.call_args.args[1]
+        assert reply["error"] == "overloaded"
+        assert reply["correlation_id"] == "cid"
+
         # Reset service state for start() test
         service.agent_wrapper = None
         service.runner = None
@@ -63,3 +94,77 @@ async def test_agent_service():
         await service.stop()
         mock_bus.return_value.stop.assert_called()
         mock_runner.return_value.close.assert_called()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_single_flight_and_load_shedding():
+    import asyncio
+
+    with (
+        patch("julio.main.load_config") as mock_load_config,
+        patch("julio.main.Persistence"),
+        patch("julio.main.MessageBus") as mock_bus,
+        patch("julio.main.SkillsLoader"),
+        patch("julio.main.AgentWrapper"),
+    ):
+        config = MagicMock()
+        config.heartbeat_interval_minutes = 0.0005  # 30ms
+        config.heartbeat_jitter = 0.0
+        config.heartbeat_max_queue_depth = 10
+        config.heartbeat_max_in_flight = 4
+        config.metrics_port = None
+        config.bus_socket_path = None
+        config.gateway_port = None
+        mock_load_config.return_value = config
+
+        bus = mock_bus.return_value
+        bus.depth = 0
+        bus.in_flight = MagicMock(return_value=0)
+        release = asyncio.Event()
+
+        async def slow_request(*args, **kwargs):
+            await release.wait()
+
+        bus.request = AsyncMock(side_effect=slow_request)
+
+        service = AgentService()
+        loop_task = asyncio.create_task(service.heartbeat_loop())
+        await asyncio.sleep(0.15)
+        # Later ticks are skipped while the first heartbeat is still running.
+        assert bus.request.call_count == 1
+
+        release.set()
+        bus.depth = 50
+        await asyncio.sleep(0.1)
+        # A saturated bus skips heartbeats altogether.
+        assert bus.request.call_count == 1
+
+        bus.depth = 0
+        await asyncio.sleep(0.1)
+        assert bus.request.call_count >= 2
+
+        service.stop_event.set()
+        await loop_task
+
+
+def test_pooled_runners_share_memory_and_artifacts():
+    with (
+        patch("julio.main.load_config") as mock_load_config,
+        patch("julio.main.Persistence"),
+        patch("julio.main.MessageBus"),
+        patch("julio.main.SkillsLoader"),
+        patch("julio.main.Runner") as mock_runner,
+    ):
+        config = MagicMock()
+        config.bus_wal_path = None
+        config.bus_socket_path = None
+        config.gateway_port = None
+        config.user_rate_limits_per_minute = {}
+        mock_load_config.return_value = config
+
+        service = AgentService()
+        service._create_runner(MagicMock())
+        service._create_runner(MagicMock())
+        first, second = (call.kwargs for call in mock_runner.call_args_list)
+        assert first["memory_service"] is second["memory_service"] is service.memory_service
+        assert first["artifact_service"] is second["artifact_service"] is service.artifact_service
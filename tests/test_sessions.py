@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from julio.sessions import RunnerPool, SessionLocks
+
+
+@pytest.mark.asyncio
+async def test_session_locks_serialize_one_session_and_evict():
+    locks = SessionLocks()
+    running = {}
+    overlaps = []
+    order = []
+
+    async def turn(session, n):
+        async with locks.hold(session):
+            running[session] = running.get(session, 0) + 1
+            overlaps.append(running[session])
+            order.append((session, n))
+            await asyncio.sleep(0.01)
+            running[session] -= 1
+
+    await asyncio.gather(
+        *(turn("a", n) for n in range(3)), *(turn("b", n) for n in range(3))
+    )
+    # Never two turns of one session at once, in arrival order per session.
+    assert max(overlaps) == 1
+    assert [n for s, n in order if s == "a"] == [0, 1, 2]
+    # Sessions interleave instead of waiting for each other.
+    assert order[:2] == [("a", 0), ("b", 0)]
+    assert len(locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_runner_pool_checks_out_distinct_runners():
+    pool = RunnerPool(["r1", "r2"])
+    async with pool.checkout() as first, pool.checkout() as second:
+        assert {first, second} == {"r1", "r2"}
+        assert pool.idle == 0
+        waiter = asyncio.create_task(pool.checkout().__aenter__())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+    assert await waiter in ("r1", "r2")
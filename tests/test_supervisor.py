@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from julio.bus_transport import RemoteBus
+from julio.supervisor import WORKER_GROUP, Supervisor
+
+
+def _echo_worker(config_path, index, socket_path):
+    asyncio.run(_echo(index, socket_path))
+
+
+async def _echo(index, socket_path):
+    # Stands in for an AgentService: answers with who handled the command.
+    remote = RemoteBus(socket_path)
+    await remote.start()
+
+    async def handle(command):
+        reply = {
+            "source_id": command["source_id"],
+            "worker": index,
+            "pid": os.getpid(),
+            "correlation_id": command["correlation_id"],
+        }
+        await remote.publish_response("agent_responses", reply, wait=True)
+
+    await remote.subscribe_to_commands(
+        "agent_commands", handle, group=WORKER_GROUP, member=f"worker-{index}", route_key="source_id"
+    )
+    await asyncio.Event().wait()
+
+
+async def _owners(supervisor, sessions):
+    replies = await asyncio.gather(
+        *(
+            supervisor.bus.request(
+                "agent_commands",
+                {"source_id": s, "content": "hi"},
+                reply_channel="agent_responses",
+                timeout=5,
+            )
+            for s in sessions
+        )
+    )
+    return {s: (r["worker"], r["pid"]) for s, r in zip(sessions, replies)}
+
+
+async def _wait_for_workers(supervisor, sessions, workers):
+    # Commands published before any worker subscribed would find no consumer.
+    for _ in range(100):
+        if supervisor.bus.has_subscribers("agent_commands"):
+            break
+        await asyncio.sleep(0.1)
+    for _ in range(100):
+        owners = await _owners(supervisor, sessions)
+        if {w for w, _ in owners.values()} == set(workers):
+            return owners
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"workers {workers} never took over sessions: {owners}")
+
+
+@pytest.mark.asyncio
+async def test_supervisor_restarts_and_rebalances_workers(tmp_path):
+    config_path = tmp_path / "agent.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "db_path": str(tmp_path / "agent.db"),
+                "bus_socket_path": str(tmp_path / "bus.sock"),
+                "bus_dead_letter_store": "memory",
+                "supervisor_workers": 2,
+            }
+        )
+    )
+    supervisor = Supervisor(
+        str(config_path), restart_delay=0.1, worker_target=_echo_worker
+    )
+    run = asyncio.create_task(supervisor.start())
+    sessions = [f"s{n}" for n in range(24)]
+    try:
+        owners = await _wait_for_workers(supervisor, sessions, [0, 1])
+
+        # A crashed worker is restarted and takes its sessions back.
+        old_pid = supervisor._processes[1].pid
+        supervisor._processes[1].kill()
+        for _ in range(100):
+            restarted = await _owners(supervisor, sessions)
+            if all(
+                w == owners[s][0] and (w == 0 or pid != old_pid)
+                for s, (w, pid) in restarted.items()
+            ):
+                break
+            await asyncio.sleep(0.1)
+        else:
+            raise AssertionError(f"worker 1 did not reclaim its sessions: {restarted}")
+
+        # SIGHUP growth only moves sessions onto the new worker.
+        config = json.loads(config_path.read_text())
+        config_path.write_text(json.dumps({**config, "supervisor_workers": 3}))
+        supervisor._reload()
+        assert len(supervisor._tasks) == 1
+        grown = await _wait_for_workers(supervisor, sessions, [0, 1, 2])
+        assert supervisor.workers == 3 and not supervisor._tasks
+        assert all(
+            grown[s][0] in (owners[s][0], 2) for s in sessions
+        )
+    finally:
+        await supervisor.stop()
+        await run